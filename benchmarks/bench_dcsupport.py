@@ -0,0 +1,84 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Micro-benchmark of the Double Counter alert parsing, the previous inline parsing of
+dcsupport against helpers.dc_alert_parser.
+
+Usage:
+    python benchmarks/bench_dcsupport.py [corpus.jsonl]
+
+The optional corpus holds one message content per line as a JSON string, e.g.
+exported from the Double Counter channel. Without it a synthetic corpus mixing
+alerts and ordinary messages is used.
+
+Version: 5.5.0
+"""
+import json
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from helpers.dc_alert_parser import parse_main_account_id  # noqa: E402
+
+
+def legacy_parse_main_account_id(content):
+    """
+    The parsing dcsupport.ban_main_account did before, without the logging and the ban.
+    """
+    if content.startswith("🔺 Alt-account intrusion") or content.startswith(":small_red_triangle: Alt-account intrusion"):
+        dc_verify_message = content.casefold()
+        temp = re.findall(r'\d+', dc_verify_message)
+        res = list(map(int, temp))
+        for i in range(0, len(res)):
+            if i == (len(res)-1):
+                continue
+        res.reverse()
+        return res[0] if res else None
+    return None
+
+
+def synthetic_corpus(size=10000, seed=42):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        alt_id = rng.randrange(10 ** 17, 10 ** 19)
+        main_id = rng.randrange(10 ** 17, 10 ** 19)
+        if rng.random() < 0.3:
+            prefix = rng.choice(("🔺 Alt-account intrusion", ":small_red_triangle: Alt-account intrusion"))
+            corpus.append(
+                f"{prefix}\n"
+                f"<@{alt_id}> ({alt_id}) has been detected as an alt of <@{main_id}>.\n"
+                f"Account created 3 days ago, verified 2 minutes ago. Main account: {main_id}"
+            )
+        else:
+            corpus.append(f"User <@{alt_id}> passed the verification {rng.randrange(100)} seconds ago")
+    return corpus
+
+
+def load_corpus(path):
+    with open(path) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+def main():
+    corpus = load_corpus(sys.argv[1]) if len(sys.argv) > 1 else synthetic_corpus()
+
+    # Both parsers have to agree on the whole corpus before they are compared
+    mismatches = [
+        content for content in corpus
+        if parse_main_account_id(content) != legacy_parse_main_account_id(content)
+    ]
+    print(f"{len(corpus)} messages, {len(mismatches)} parsed differently")
+
+    for name, parse in (("legacy", legacy_parse_main_account_id), ("compiled", parse_main_account_id)):
+        runs = timeit.repeat(lambda: [parse(content) for content in corpus], number=5, repeat=5)
+        per_message = min(runs) / 5 / len(corpus) * 1e6
+        print(f"{name:>10}: {per_message:.2f} µs per message")
+
+
+if __name__ == "__main__":
+    main()
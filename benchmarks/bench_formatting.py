@@ -0,0 +1,88 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Micro-benchmark of the currency formatting, the previous async string-slicing
+format_currency against the synchronous helpers.formatting one.
+
+Usage:
+    python benchmarks/bench_formatting.py [count]
+
+Needs a config.json in the repository root, like the bot.
+
+Version: 5.5.0
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.realpath(os.path.join(os.path.dirname(__file__), "..")))
+
+from helpers.formatting import format_currency  # noqa: E402
+
+
+async def legacy_format_currency(value, currency_symbol="$"):
+    """
+    The format_currency helpers.formatting had before.
+    """
+    parts = str(value).split('.')
+    integer_part = parts[0]
+    decimal_part = parts[1] if len(parts) > 1 else ""
+    num_decimal_places = 2 if int(integer_part) > 0 else 5
+    if decimal_part and len(decimal_part) > num_decimal_places:
+        decimal_part = decimal_part[:num_decimal_places]
+    formatted_integer_part = ""
+    for i in range(len(integer_part), 0, -3):
+        formatted_integer_part = "," + integer_part[max(i-3, 0):i] + formatted_integer_part
+    if formatted_integer_part and formatted_integer_part[0] == ",":
+        formatted_integer_part = formatted_integer_part[1:]
+    formatted_value = formatted_integer_part + ("." + decimal_part if decimal_part else "")
+    return f"{currency_symbol} {formatted_value}"
+
+
+def values(count, seed=42):
+    """
+    Prices, volumes and order book amounts spanning 1e-4 to 1e10.
+    """
+    rng = random.Random(seed)
+    return [10 ** rng.uniform(-4, 10) for _ in range(count)]
+
+
+async def bench_legacy(sample):
+    for value in sample:
+        await legacy_format_currency(value)
+
+
+def bench_current(sample):
+    for value in sample:
+        format_currency(value)
+
+
+def best_of(run, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sample = values(count)
+
+    loop = asyncio.new_event_loop()
+    try:
+        legacy = best_of(lambda: loop.run_until_complete(bench_legacy(sample)))
+    finally:
+        loop.close()
+    current = best_of(lambda: bench_current(sample))
+
+    print(f"{count} values")
+    print(f"    legacy: {legacy / count * 1e6:.2f} µs per value")
+    print(f"   current: {current / count * 1e6:.2f} µs per value ({legacy / current:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
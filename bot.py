@@ -13,19 +13,16 @@ import platform
 import random
 import logging
 import asyncio
-import time
-import multiprocessing
-import aiosqlite
 import discord
 from discord.ext import commands, tasks
 from discord.ext.commands import Bot, Context
-from helpers import configuration_manager, db_manager, dcsupport, kick_unverified, embed_and_messages, smr_market_data_embed
+from helpers import configuration_manager, db_manager, dcsupport, kick_unverified, embed_and_messages, smr_market_data_embed, thread_keep_alive
 from helpers.logger import setup_logger
+from helpers.message_router import MessageRouter
+from helpers.scheduler import PeriodicJob
+from helpers.smr_market_data import smd_assets, smd_charts, smd_fetch, smd_livebook
 import exceptions
 
-# Set up the logger
-setup_logger()
-
 # Load configuration
 config = configuration_manager.load_config('config.json')
 prefix = config["prefix"]
@@ -33,6 +30,8 @@ token = config["token"]
 sync_commands_globally = config["sync_commands_globally"]
 dc_bot_channel = config["dc_bot_channel"]
 tea_comms_channel = config["tea_comms_channel"]
+bitfinex_live_book = config.get("bitfinex_live_book", False)
+bitfinex_live_replay_file = config.get("bitfinex_live_replay_file")
 
 """
 Setup bot intents (events restrictions)
@@ -69,6 +68,8 @@ intents.presences = True
 
 intents = discord.Intents.default()
 intents.message_content = True
+# Member join and role update events drive the kick of unverified members
+intents.members = True
 """
 Uncomment this if you want to use prefix (normal) commands.
 It is recommended to use slash commands and therefore not use prefix commands.
@@ -86,63 +87,69 @@ bot = Bot(
 bot.logger = logging.getLogger("discord_bot")
 
 
-def background_task():
-    """Launched background tasks"""
-    bot.logger.info("Starting background tasks for the DLT ledger data")
-    asyncio.run(smr_market_data_embed.main())
-    time.sleep(24 * 60 * 60)
-    background_task()
+"""
+Refresh the market data inside the bot event loop, the result is handed to the
+commands through the in-memory embed cache.
+"""
+bot.market_data_job = PeriodicJob(
+    "market data refresh",
+    smr_market_data_embed.build_embed,
+    interval=smr_market_data_embed.refresh_interval_hours * 60 * 60,
+    jitter=config.get("market_data_refresh_jitter_minutes", 5) * 60,
+)
 
+"""
+Route the messages of the monitored channels to their handlers, cogs can register
+their own with self.bot.message_router.register(channel_id, handler).
+"""
+bot.message_router = MessageRouter()
+for dc_channel_id in dc_bot_channel:
+    bot.message_router.register(dc_channel_id, dcsupport.ban_main_account)
 
-def run_bot():
-    """Starts the discord bot"""
-    asyncio.run(init_db())
-    asyncio.run(load_cogs())
-    asyncio.run(embed_and_messages.create_empty_embed_and_messages())
-    bot.run(token)
+"""
+Check the monitored threads regularly, the ones about to be auto archived are kept alive.
+"""
+bot.keep_alive_job = PeriodicJob(
+    "thread keep alive",
+    lambda: thread_keep_alive.keep_them_all_alive(bot),
+    interval=thread_keep_alive.check_interval,
+)
 
 
-async def init_db():
-    async with aiosqlite.connect(
-        f"{os.path.realpath(os.path.dirname(__file__))}/database/database.db"
-    ) as db:
-        with open(
-            f"{os.path.realpath(os.path.dirname(__file__))}/database/schema.sql"
-        ) as file:
-            await db.executescript(file.read())
-        await db.commit()
+def run_bot():
+    """Starts the discord bot"""
+    # Set up the logger here, worker processes import this module and must not rotate the log
+    setup_logger()
+    try:
+        asyncio.run(start_bot())
+    except KeyboardInterrupt:
+        return
 
 
-async def keep_them_all_alive():
+async def start_bot():
     """
-    Function that keeps all threads alive
+    Runs the discord bot and the resources it shares with the cogs in one event loop.
     """
-    bot.logger.info("Looking for threads to keep alive")
-    thread_ids = await db_manager.get_keep_alive_thread()
-    for thread_id in thread_ids:
-        await keep_alive(thread_id)
+    await db_manager.connect()
+    await load_cogs()
+    await embed_and_messages.create_empty_embed_and_messages()
+    smd_fetch.start_session()
+    if bitfinex_live_book:
+        smd_livebook.start_live_books(smd_assets.all_bitfinex_tickers(), bitfinex_live_replay_file)
+    bot.market_data_job.start()
+    try:
+        async with bot:
+            await bot.start(token)
+    finally:
+        await bot.market_data_job.stop()
+        await bot.keep_alive_job.stop()
+        await kick_unverified.unverified_tracker.stop()
+        await smd_livebook.stop_live_books()
+        await smd_fetch.close_session()
+        smd_charts.shutdown_executor()
+        await db_manager.close()
 
 
-async def keep_alive(thread_id):
-    """
-    Function that sends a 'ping' message in the thread and deletes it
-    """
-    
-    bot.logger.info(f'Keeping thread {thread_id} alive')
-    try:
-        channel = await bot.fetch_channel(int(thread_id))
-        msg = await channel.send('ping')
-        await msg.delete()
-    except discord.NotFound:
-        print(f'Thread not found for thread_id: {thread_id}. Consider removing it from the list.')
-    except discord.Forbidden:
-        print(f'Permission denied for thread_id: {thread_id}. Consider checking bot permissions.')
-    except discord.HTTPException as e:
-        print(f'An error occurred for thread_id: {thread_id}. Details: {e}')
-    except ValueError:
-        print(f'Invalid thread_id format: {thread_id}. Consider removing it from the list.')
-    except Exception as e:
-        print(f'An unexpected error occurred: {e}')
 """
 Create a bot variable to access the config file in cogs so that you don't need to import it every time.
 
@@ -164,11 +171,11 @@ async def on_ready() -> None:
     bot.logger.info(f"Running on: {platform.system()} {platform.release()} ({os.name})")
     bot.logger.info("-------------------")
     status_task.start()
-    loop_keep_alive.start()
-    kick_users.start()
+    bot.keep_alive_job.start()
     if sync_commands_globally:
         bot.logger.info("Syncing commands globally...")
         await bot.tree.sync()
+    await kick_unverified.unverified_tracker.start(bot)
 
 
 @tasks.loop(minutes=5.0)
@@ -181,21 +188,36 @@ async def status_task() -> None:
     await bot.change_presence(activity=discord.Game(random.choice(statuses)))
     bot.logger.info("Changes bot status")
 
-@tasks.loop(hours=168.0)
-async def loop_keep_alive() -> None:
+@bot.event
+async def on_member_join(member: discord.Member) -> None:
+    """
+    The code in this event is executed every time someone joins a server the bot is in.
+
+    :param member: The member that joined.
+    """
+    await kick_unverified.unverified_tracker.update_member(member)
+
+
+@bot.event
+async def on_member_update(before: discord.Member, after: discord.Member) -> None:
     """
-    Setup the keep alive loop
+    The code in this event is executed every time the roles or nickname of a member change.
+
+    :param before: The member before the update.
+    :param after: The member after the update.
     """
-    bot.logger.info("Started keep alive task")
-    await keep_them_all_alive()
+    if before.roles != after.roles:
+        await kick_unverified.unverified_tracker.update_member(after)
 
-@tasks.loop(hours=8.0)
-async def kick_users() -> None:
+
+@bot.event
+async def on_member_remove(member: discord.Member) -> None:
     """
-    Setup the kick unverified users loop
+    The code in this event is executed every time someone leaves or is kicked from a server the bot is in.
+
+    :param member: The member that left.
     """
-    bot.logger.info("Started kick unverified users task")
-    await kick_unverified.kick_unverified_accounts(bot)
+    await kick_unverified.unverified_tracker.remove_member(member)
 
 
 @bot.event
@@ -205,9 +227,7 @@ async def on_message(message: discord.Message) -> None:
 
     :param message: The message that was sent.
     """
-    for dc_channel_id in dc_bot_channel:
-        if message.channel.id == int(dc_channel_id):
-            await dcsupport.ban_main_account(message)
+    await bot.message_router.dispatch(message)
     await bot.process_commands(message)
 
     if message.author == bot.user or message.author.bot:
@@ -326,10 +346,5 @@ async def load_cogs() -> None:
                 exception = f"{type(e).__name__}: {e}"
                 bot.logger.error(f"Failed to load extension {extension}\n{exception}")
 
-# Create processing for the bot and the background tasks
-process_one = multiprocessing.Process(target=run_bot)
-process_two = multiprocessing.Process(target=background_task)
-
-# Start the processes
-process_one.start()
-process_two.start()
\ No newline at end of file
+if __name__ == "__main__":
+    run_bot()
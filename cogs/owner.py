@@ -11,7 +11,7 @@ from discord import app_commands
 from discord.ext import commands
 from discord.ext.commands import Context
 
-from helpers import checks, db_manager
+from helpers import checks, configuration_manager, db_manager
 
 
 class Owner(commands.Cog, name="owner"):
@@ -171,6 +171,37 @@ class Owner(commands.Cog, name="owner"):
         )
         await context.send(embed=embed)
 
+    @commands.hybrid_command(
+        name="reloadconfig",
+        description="Reloads the configuration if config.json changed.",
+    )
+    @checks.is_owner()
+    async def reloadconfig(self, context: Context) -> None:
+        """
+        The bot will read config.json again if the file was modified.
+
+        :param context: The hybrid command context.
+        """
+        try:
+            reloaded = configuration_manager.reload_config()
+        except Exception:
+            embed = discord.Embed(
+                description="Could not reload `config.json`.", color=0xE02B2B
+            )
+            await context.send(embed=embed)
+            return
+        if not reloaded:
+            embed = discord.Embed(
+                description="`config.json` did not change since it was loaded.",
+                color=0x9C84EF,
+            )
+            await context.send(embed=embed)
+            return
+        embed = discord.Embed(
+            description="Successfully reloaded `config.json`.", color=0x9C84EF
+        )
+        await context.send(embed=embed)
+
     @commands.hybrid_command(
         name="shutdown",
         description="Make the bot shutdown.",
@@ -6,14 +6,19 @@ Shimmer market data
 Version: 5.5.0
 """
 
+import discord
 from discord.ext import commands
 from discord.ext.commands import Context
 from helpers import checks
+from helpers.embed_cache import get_market_data_embed
 import helpers.configuration_manager as configuration_manager
-from helpers.smr_market_data_embed import build_embed
+from helpers.smr_market_data_embed import build_live_depth_embed
+from helpers.smr_market_data.smd_assets import assets, get_asset
+from helpers.smr_market_data.smd_charts import get_charts
+import io
 import logging
-import pickle
 import traceback
+from typing import Literal, Optional
 
 logger = logging.getLogger("discord_bot")
 
@@ -21,6 +26,9 @@ logger = logging.getLogger("discord_bot")
 config = configuration_manager.load_config('config.json')
 bot_reply_channel_id = config["bot_reply_channel"]
 
+# Keys of the tracked assets offered by /smr-market
+AssetKey = Literal[tuple(asset.key for asset in assets)]
+
 
 # Here we name the cog and create a new class for the cog.
 class Tokens(commands.Cog, name="tokens"):
@@ -32,15 +40,17 @@ class Tokens(commands.Cog, name="tokens"):
     @commands.cooldown(1, 360, commands.BucketType.user)
     @commands.hybrid_command(
         name="smr-market",
-        description="Shares the Shimmer market data",
+        description="Shares the market data of a tracked asset",
     )
     # This will only allow non-blacklisted members to execute the command
     @checks.not_blacklisted()
-    async def shimmer_market_data(self, context: Context) -> None:
+    async def shimmer_market_data(self, context: Context, chart: Optional[Literal["24h", "7d", "30d"]] = None, asset: Optional[AssetKey] = None) -> None:
         """
-        This command prints an embed with the Shimmer Market data
+        This command prints an embed with the Market data of an asset
 
         :param context: The application command context.
+        :param chart: Attach the price and TVL charts of this period.
+        :param asset: The asset to show, defaults to the first tracked asset.
         """
         global bot_reply_channel_id
 
@@ -51,9 +61,19 @@ class Tokens(commands.Cog, name="tokens"):
             return
 
         try:
-            with open("assets/embed_shimmer_market_data.pkl", "rb") as f:
-                embed = pickle.load(f)
-            await context.send(embed=embed)
+            market_asset = get_asset(asset)
+            embeds = [get_market_data_embed(market_asset.key).get()]
+            live_depth_embed = await build_live_depth_embed(market_asset)
+            if live_depth_embed is not None:
+                embeds.append(live_depth_embed)
+
+            files = []
+            if chart is not None:
+                files = [
+                    discord.File(io.BytesIO(image), filename=filename)
+                    for filename, image in await get_charts(market_asset, chart)
+                ]
+            await context.send(embeds=embeds, files=files)
 
         except Exception:
             print(traceback.format_exc())
@@ -71,11 +91,17 @@ class Tokens(commands.Cog, name="tokens"):
 
         :param context: The application command context.
         """
+        if self.bot.market_data_job.is_running:
+            await context.send(
+                "A Shimmer Market Data update is already running.", ephemeral=True
+            )
+            return
+
         try:
             await context.send(
                 "Hello! Shimmer Market Data update launced...", ephemeral=True
             )
-            await build_embed()
+            await self.bot.market_data_job.run_once()
 
         except Exception:
             print(traceback.format_exc())
@@ -3,8 +3,53 @@ CREATE TABLE IF NOT EXISTS `blacklist` (
   `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Older databases could hold the same user more than once, keep the first entry
+DELETE FROM `blacklist` WHERE rowid NOT IN (SELECT MIN(rowid) FROM `blacklist` GROUP BY `user_id`);
+CREATE UNIQUE INDEX IF NOT EXISTS `blacklist_user_id` ON `blacklist` (`user_id`);
+
 CREATE TABLE IF NOT EXISTS `threads` (
   `thread_id` varchar(20) NOT NULL,
   `guild_id` varchar(20) NOT NULL,
   `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
-);
\ No newline at end of file
+);
+
+CREATE TABLE IF NOT EXISTS `prune_queue` (
+  `guild_id` varchar(20) NOT NULL,
+  `user_id` varchar(20) NOT NULL,
+  `action` varchar(20) NOT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`guild_id`, `user_id`)
+);
+
+CREATE TABLE IF NOT EXISTS `unverified_deadlines` (
+  `guild_id` varchar(20) NOT NULL,
+  `user_id` varchar(20) NOT NULL,
+  `deadline` integer NOT NULL,
+  PRIMARY KEY (`guild_id`, `user_id`)
+);
+
+CREATE INDEX IF NOT EXISTS `unverified_deadlines_deadline` ON `unverified_deadlines` (`deadline`);
+
+CREATE TABLE IF NOT EXISTS `banned_accounts` (
+  `guild_id` varchar(20) NOT NULL,
+  `user_id` varchar(20) NOT NULL,
+  `created_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`guild_id`, `user_id`)
+);
+
+CREATE TABLE IF NOT EXISTS `market_snapshots` (
+  `metric` varchar(100) NOT NULL,
+  `resolution` integer NOT NULL,
+  `ts` integer NOT NULL,
+  `value` real NOT NULL,
+  PRIMARY KEY (`metric`, `resolution`, `ts`)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS `market_snapshots_resolution_ts` ON `market_snapshots` (`resolution`, `ts`);
+
+CREATE TABLE IF NOT EXISTS `chain_heads` (
+  `alias_id` varchar(66) NOT NULL PRIMARY KEY,
+  `output_id` varchar(70) NOT NULL,
+  `amount` varchar(40),
+  `updated_at` timestamp NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
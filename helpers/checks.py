@@ -6,14 +6,12 @@ Description:
 Version: 5.5.0
 """
 
-import json
-import os
 from typing import Callable, TypeVar
 
 from discord.ext import commands
 
 from exceptions import *
-from helpers import db_manager
+from helpers import configuration_manager, db_manager
 
 T = TypeVar("T")
 
@@ -24,11 +22,7 @@ def is_owner() -> Callable[[T], T]:
     """
 
     async def predicate(context: commands.Context) -> bool:
-        with open(
-            f"{os.path.realpath(os.path.dirname(__file__))}/../config.json"
-        ) as file:
-            data = json.load(file)
-        if context.author.id not in data["owners"]:
+        if context.author.id not in configuration_manager.get_config().owners:
             raise UserNotOwner
         return True
 
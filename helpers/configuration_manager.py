@@ -8,6 +8,8 @@ Version: 5.5.0
 import os
 import sys
 import json
+from collections.abc import Mapping
+from types import MappingProxyType
 
 # Get the path to the current directory
 current_directory = os.path.realpath(os.path.dirname(__file__))
@@ -15,11 +17,82 @@ current_directory = os.path.realpath(os.path.dirname(__file__))
 # Navigate to the parent directory using '..'
 parent_directory = os.path.realpath(os.path.join(current_directory, '..'))
 
+config_file_path = os.path.join(parent_directory, 'config.json')
+
+# The process-wide configuration, parsed once by get_config()
+_config = None
+
+
+class Config(Mapping):
+    """
+    Read-only view of config.json.
+
+    Nested objects are frozen as well, lists become tuples and objects read-only
+    mappings, and the bot owners are kept as a frozenset for fast lookups.
+    """
+
+    def __init__(self, data, mtime):
+        self._data = _freeze(data)
+        self.owners = frozenset(int(owner) for owner in data.get("owners", []))
+        self.mtime = mtime
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
 # Check if 'config.json' exists in the parent directory
-def load_config(config_file_path):
-    config_file_path = os.path.join(parent_directory, 'config.json')
+def _read_config():
     if not os.path.isfile(config_file_path):
         sys.exit("'config.json' not found in the parent directory! Please add it and try again.")
-    else:
-        with open(config_file_path) as file:
-            return json.load(file)
\ No newline at end of file
+    mtime = os.stat(config_file_path).st_mtime
+    with open(config_file_path) as file:
+        return Config(json.load(file), mtime)
+
+
+def get_config():
+    """
+    Get the configuration, config.json is only read the first time.
+
+    :return: The configuration.
+    """
+    global _config
+    if _config is None:
+        _config = _read_config()
+    return _config
+
+
+def reload_config():
+    """
+    Read config.json again if it was modified since it was last read.
+
+    Values that modules copied from the configuration when they were imported keep
+    their old value, everything looked up through get_config() uses the new one.
+
+    :return: True if the configuration was reloaded.
+    """
+    global _config
+    if _config is not None and os.stat(config_file_path).st_mtime == _config.mtime:
+        return False
+    _config = _read_config()
+    return True
+
+
+def load_config(config_file_path):
+    """
+    Get the configuration, kept for the modules loading it when they are imported.
+    """
+    return get_config()
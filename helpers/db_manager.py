@@ -6,11 +6,91 @@ Description:
 Version: 5.5.0
 """
 
+import asyncio
+import logging
 import os
 
 import aiosqlite
 
 DATABASE_PATH = f"{os.path.realpath(os.path.dirname(__file__))}/../database/database.db"
+SCHEMA_PATH = f"{os.path.realpath(os.path.dirname(__file__))}/../database/schema.sql"
+
+# Applied to the connection when it is opened
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-8000",
+    "PRAGMA busy_timeout=5000",
+)
+
+logger = logging.getLogger("discord_bot")
+
+# The long-lived connection owned by the bot, see connect()
+_connection = None
+# Serializes write transactions on the shared connection
+_write_lock = asyncio.Lock()
+# In-memory copy of the blacklist, every change is written through to the database
+_blacklist = set()
+# In-memory copy of the main accounts banned after a Double Counter alert, as (guild_id, user_id)
+_banned_accounts = set()
+
+
+async def connect() -> aiosqlite.Connection:
+    """
+    This function will open the shared database connection and create the tables if needed.
+
+    :return: The shared connection.
+    """
+    global _connection
+    if _connection is None:
+        _connection = await aiosqlite.connect(DATABASE_PATH)
+        for pragma in PRAGMAS:
+            await _connection.execute(pragma)
+        with open(SCHEMA_PATH) as file:
+            await _connection.executescript(file.read())
+        await _connection.commit()
+        await _load_blacklist(_connection)
+        await _load_banned_accounts(_connection)
+        logger.info("Opened the database connection")
+    return _connection
+
+
+async def close() -> None:
+    """
+    This function will close the shared database connection.
+    """
+    global _connection
+    if _connection is not None:
+        await _connection.execute("PRAGMA optimize")
+        await _connection.close()
+        _connection = None
+        logger.info("Closed the database connection")
+
+
+async def get_connection() -> aiosqlite.Connection:
+    """
+    This function will return the shared database connection, opening it if needed.
+
+    :return: The shared connection.
+    """
+    if _connection is None:
+        return await connect()
+    return _connection
+
+
+async def _load_blacklist(db: aiosqlite.Connection) -> None:
+    async with db.execute("SELECT user_id FROM blacklist") as cursor:
+        rows = await cursor.fetchall()
+    _blacklist.clear()
+    _blacklist.update(int(row[0]) for row in rows)
+
+
+async def _load_banned_accounts(db: aiosqlite.Connection) -> None:
+    async with db.execute("SELECT guild_id, user_id FROM banned_accounts") as cursor:
+        rows = await cursor.fetchall()
+    _banned_accounts.clear()
+    _banned_accounts.update((int(row[0]), int(row[1])) for row in rows)
 
 
 async def get_blacklisted_users() -> list:
@@ -20,27 +100,22 @@ async def get_blacklisted_users() -> list:
     :param user_id: The ID of the user that should be checked.
     :return: True if the user is blacklisted, False if not.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        async with db.execute(
-            "SELECT user_id, strftime('%s', created_at) FROM blacklist"
-        ) as cursor:
-            result = await cursor.fetchall()
-            return result
+    db = await get_connection()
+    async with db.execute(
+        "SELECT user_id, strftime('%s', created_at) FROM blacklist"
+    ) as cursor:
+        result = await cursor.fetchall()
+        return result
 
 
 async def is_blacklisted(user_id: int) -> bool:
     """
-    This function will check if a user is blacklisted.
+    This function will check if a user is blacklisted, using the in-memory copy of the blacklist.
 
     :param user_id: The ID of the user that should be checked.
     :return: True if the user is blacklisted, False if not.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        async with db.execute(
-            "SELECT * FROM blacklist WHERE user_id=?", (user_id,)
-        ) as cursor:
-            result = await cursor.fetchone()
-            return result is not None
+    return int(user_id) in _blacklist
 
 
 async def add_user_to_blacklist(user_id: int) -> int:
@@ -49,13 +124,12 @@ async def add_user_to_blacklist(user_id: int) -> int:
 
     :param user_id: The ID of the user that should be added into the blacklist.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        await db.execute("INSERT INTO blacklist(user_id) VALUES (?)", (user_id,))
+    db = await get_connection()
+    async with _write_lock:
+        await db.execute("INSERT OR IGNORE INTO blacklist(user_id) VALUES (?)", (user_id,))
         await db.commit()
-        rows = await db.execute("SELECT COUNT(*) FROM blacklist")
-        async with rows as cursor:
-            result = await cursor.fetchone()
-            return result[0] if result is not None else 0
+        _blacklist.add(int(user_id))
+    return len(_blacklist)
 
 
 async def remove_user_from_blacklist(user_id: int) -> int:
@@ -64,13 +138,12 @@ async def remove_user_from_blacklist(user_id: int) -> int:
 
     :param user_id: The ID of the user that should be removed from the blacklist.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    db = await get_connection()
+    async with _write_lock:
         await db.execute("DELETE FROM blacklist WHERE user_id=?", (user_id,))
         await db.commit()
-        rows = await db.execute("SELECT COUNT(*) FROM blacklist")
-        async with rows as cursor:
-            result = await cursor.fetchone()
-            return result[0] if result is not None else 0
+        _blacklist.discard(int(user_id))
+    return len(_blacklist)
 
 
 async def add_keep_alive_thread(thread_id: int, guild_id: int) -> int:
@@ -80,14 +153,15 @@ async def add_keep_alive_thread(thread_id: int, guild_id: int) -> int:
     :param thread_id: The ID of the thread that should be kept alive.
     :param guild_id: The ID of the server where the thread has been added.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    db = await get_connection()
+    async with _write_lock:
         await db.execute("INSERT INTO threads(thread_id, guild_id) VALUES (?, ?)", (thread_id, guild_id))
         await db.commit()
-        
-        rows = await db.execute("SELECT COUNT(*) FROM threads")
-        async with rows as cursor:
-            result = await cursor.fetchone()
-            return result[0] if result is not None else 0
+
+    rows = await db.execute("SELECT COUNT(*) FROM threads")
+    async with rows as cursor:
+        result = await cursor.fetchone()
+        return result[0] if result is not None else 0
 
 async def remove_keep_alive_thread(thread_id: int, guild_id: int) -> int:
     """
@@ -96,7 +170,8 @@ async def remove_keep_alive_thread(thread_id: int, guild_id: int) -> int:
     :param thread_id: The ID of the thread.
     :param guild_id: The ID of the server where the thread has been added.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
+    db = await get_connection()
+    async with _write_lock:
         await db.execute(
             "DELETE FROM threads WHERE thread_id=? AND guild_id=?",
             (
@@ -105,16 +180,16 @@ async def remove_keep_alive_thread(thread_id: int, guild_id: int) -> int:
             ),
         )
         await db.commit()
-        rows = await db.execute(
-            "SELECT COUNT(*) FROM threads WHERE thread_id=? AND guild_id=?",
-            (
-                thread_id,
-                guild_id,
-            ),
-        )
-        async with rows as cursor:
-            result = await cursor.fetchone()
-            return result[0] if result is not None else 0
+    rows = await db.execute(
+        "SELECT COUNT(*) FROM threads WHERE thread_id=? AND guild_id=?",
+        (
+            thread_id,
+            guild_id,
+        ),
+    )
+    async with rows as cursor:
+        result = await cursor.fetchone()
+        return result[0] if result is not None else 0
 
 
 async def get_keep_alive_thread() -> list:
@@ -124,16 +199,16 @@ async def get_keep_alive_thread() -> list:
     :param thread_id: The ID of the thread that should be kept checked.
     :param guild_id: The ID of the server that should be checked.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        rows = await db.execute(
-            "SELECT thread_id FROM threads",
-        )
-        async with rows as cursor:
-            result = await cursor.fetchall()
-            result_list = []
-            for row in result:
-                result_list.append(row[0])
-            return result_list
+    db = await get_connection()
+    rows = await db.execute(
+        "SELECT thread_id FROM threads",
+    )
+    async with rows as cursor:
+        result = await cursor.fetchall()
+        result_list = []
+        for row in result:
+            result_list.append(row[0])
+        return result_list
 
 
 async def get_all_guild_ids() -> list:
@@ -142,13 +217,288 @@ async def get_all_guild_ids() -> list:
 
     :return: A list of all guild IDs.
     """
-    async with aiosqlite.connect(DATABASE_PATH) as db:
-        rows = await db.execute(
-          "SELECT guild_id FROM threads",
+    db = await get_connection()
+    rows = await db.execute(
+        "SELECT guild_id FROM threads",
+    )
+    async with rows as cursor:
+        result = await cursor.fetchall()
+        result_list = []
+        for row in result:
+            result_list.append(row[0])
+        return result_list
+
+
+async def add_prune_tasks(tasks: list) -> int:
+    """
+    This function will queue members to be pruned, members that are already queued keep their task.
+
+    :param tasks: The (guild_id, user_id, action) tuples to queue.
+    :return: The number of queued prune tasks.
+    """
+    db = await get_connection()
+    async with _write_lock:
+        await db.executemany(
+            "INSERT OR IGNORE INTO prune_queue(guild_id, user_id, action) VALUES (?, ?, ?)",
+            tasks,
+        )
+        await db.commit()
+    return await count_prune_tasks()
+
+
+async def get_prune_tasks() -> list:
+    """
+    This function will get all the queued prune tasks, oldest first.
+
+    :return: A list of (guild_id, user_id, action) tuples.
+    """
+    db = await get_connection()
+    rows = await db.execute(
+        "SELECT guild_id, user_id, action FROM prune_queue ORDER BY created_at",
+    )
+    async with rows as cursor:
+        result = await cursor.fetchall()
+        return [(int(row[0]), int(row[1]), row[2]) for row in result]
+
+
+async def remove_prune_task(guild_id: int, user_id: int) -> None:
+    """
+    This function will remove a prune task once it has been handled.
+
+    :param guild_id: The ID of the server of the member.
+    :param user_id: The ID of the member.
+    """
+    db = await get_connection()
+    async with _write_lock:
+        await db.execute(
+            "DELETE FROM prune_queue WHERE guild_id=? AND user_id=?",
+            (
+                guild_id,
+                user_id,
+            ),
+        )
+        await db.commit()
+
+
+async def count_prune_tasks() -> int:
+    """
+    This function will count the queued prune tasks.
+
+    :return: The number of queued prune tasks.
+    """
+    db = await get_connection()
+    rows = await db.execute("SELECT COUNT(*) FROM prune_queue")
+    async with rows as cursor:
+        result = await cursor.fetchone()
+        return result[0] if result is not None else 0
+
+
+async def set_unverified_deadlines(deadlines: list) -> None:
+    """
+    This function will save the time by which unverified members have to verify.
+
+    :param deadlines: The (guild_id, user_id, deadline) tuples, the deadline is the UNIX timestamp after which the member is kicked.
+    """
+    db = await get_connection()
+    async with _write_lock:
+        await db.executemany(
+            "INSERT OR REPLACE INTO unverified_deadlines(guild_id, user_id, deadline) VALUES (?, ?, ?)",
+            deadlines,
+        )
+        await db.commit()
+
+
+async def remove_unverified_deadlines(members: list) -> None:
+    """
+    This function will stop tracking the given members.
+
+    :param members: The (guild_id, user_id) tuples of the members.
+    """
+    db = await get_connection()
+    async with _write_lock:
+        await db.executemany(
+            "DELETE FROM unverified_deadlines WHERE guild_id=? AND user_id=?",
+            members,
+        )
+        await db.commit()
+
+
+async def get_unverified_deadlines() -> list:
+    """
+    This function will get all the tracked unverified members.
+
+    :return: A list of (guild_id, user_id, deadline) tuples.
+    """
+    db = await get_connection()
+    rows = await db.execute(
+        "SELECT guild_id, user_id, deadline FROM unverified_deadlines",
+    )
+    async with rows as cursor:
+        result = await cursor.fetchall()
+        return [(int(row[0]), int(row[1]), int(row[2])) for row in result]
+
+
+async def add_banned_account(guild_id: int, user_id: int) -> bool:
+    """
+    This function will record that an account is banned from a server.
+
+    The in-memory copy is updated before the database is, so an alert repeated while
+    the first one is being handled is already seen as a duplicate.
+
+    :param guild_id: The ID of the server.
+    :param user_id: The ID of the banned account.
+    :return: True if the account was recorded, False if it was recorded already.
+    """
+    key = (int(guild_id), int(user_id))
+    if key in _banned_accounts:
+        return False
+    _banned_accounts.add(key)
+    db = await get_connection()
+    async with _write_lock:
+        await db.execute(
+            "INSERT OR IGNORE INTO banned_accounts(guild_id, user_id) VALUES (?, ?)",
+            key,
         )
-        async with rows as cursor:
-            result = await cursor.fetchall()
-            result_list = []
-            for row in result:
-                result_list.append(row[1])
-            return result_list
+        await db.commit()
+    return True
+
+
+async def remove_banned_account(guild_id: int, user_id: int) -> None:
+    """
+    This function will forget a banned account, e.g. when the ban failed.
+
+    :param guild_id: The ID of the server.
+    :param user_id: The ID of the account.
+    """
+    key = (int(guild_id), int(user_id))
+    _banned_accounts.discard(key)
+    db = await get_connection()
+    async with _write_lock:
+        await db.execute(
+            "DELETE FROM banned_accounts WHERE guild_id=? AND user_id=?",
+            key,
+        )
+        await db.commit()
+
+
+async def add_market_snapshots(snapshots: list) -> None:
+    """
+    This function will store market data points.
+
+    :param snapshots: The (metric, resolution, ts, value) tuples to store, a point
+                      already stored for the same metric, resolution and time is replaced.
+    """
+    db = await get_connection()
+    async with _write_lock:
+        await db.executemany(
+            "INSERT OR REPLACE INTO market_snapshots(metric, resolution, ts, value) VALUES (?, ?, ?, ?)",
+            snapshots,
+        )
+        await db.commit()
+
+
+async def downsample_market_snapshots(source_resolution: int, resolution: int, since: int) -> None:
+    """
+    This function will (re)compute the averages of the market data points per time bucket.
+
+    :param source_resolution: The resolution of the points that are averaged.
+    :param resolution: The length of a bucket in seconds.
+    :param since: UNIX timestamp of the first bucket to compute, it should be the start of a bucket.
+    """
+    db = await get_connection()
+    async with _write_lock:
+        await db.execute(
+            """
+            INSERT OR REPLACE INTO market_snapshots(metric, resolution, ts, value)
+            SELECT metric, ?, ts - ts % ?, AVG(value) FROM market_snapshots
+            WHERE resolution=? AND ts >= ?
+            GROUP BY metric, ts - ts % ?
+            """,
+            (
+                resolution,
+                resolution,
+                source_resolution,
+                since,
+                resolution,
+            ),
+        )
+        await db.commit()
+
+
+async def remove_market_snapshots(resolution: int, before: int) -> None:
+    """
+    This function will delete the market data points of a resolution older than the given time.
+
+    :param resolution: The resolution of the points.
+    :param before: UNIX timestamp, older points are deleted.
+    """
+    db = await get_connection()
+    async with _write_lock:
+        await db.execute(
+            "DELETE FROM market_snapshots WHERE resolution=? AND ts < ?",
+            (
+                resolution,
+                before,
+            ),
+        )
+        await db.commit()
+
+
+async def get_market_snapshots(metric: str, resolution: int, since: int) -> list:
+    """
+    This function will get the market data points of a metric.
+
+    :param metric: The name of the metric.
+    :param resolution: The resolution of the points.
+    :param since: UNIX timestamp of the oldest point.
+    :return: A list of (ts, value) tuples ordered by time.
+    """
+    db = await get_connection()
+    rows = await db.execute(
+        "SELECT ts, value FROM market_snapshots WHERE metric=? AND resolution=? AND ts >= ? ORDER BY ts",
+        (
+            metric,
+            resolution,
+            since,
+        ),
+    )
+    async with rows as cursor:
+        return await cursor.fetchall()
+
+
+async def get_chain_head(alias_id: str):
+    """
+    This function will get the last reached output of a Shimmer alias and the last known amount of the alias.
+
+    :param alias_id: The ID of the alias.
+    :return: An (output_id, amount) tuple, the amount is None until an unspent output was reached, or None if nothing is known.
+    """
+    db = await get_connection()
+    rows = await db.execute(
+        "SELECT output_id, amount FROM chain_heads WHERE alias_id=?",
+        (alias_id,),
+    )
+    async with rows as cursor:
+        result = await cursor.fetchone()
+        return tuple(result) if result is not None else None
+
+
+async def set_chain_head(alias_id: str, output_id: str, amount: str = None) -> None:
+    """
+    This function will save the last reached output of a Shimmer alias and the last known amount of the alias.
+
+    :param alias_id: The ID of the alias.
+    :param output_id: The ID of the output.
+    :param amount: The amount of the last unspent output reached, in glow.
+    """
+    db = await get_connection()
+    async with _write_lock:
+        await db.execute(
+            "INSERT OR REPLACE INTO chain_heads(alias_id, output_id, amount, updated_at) VALUES (?, ?, ?, CURRENT_TIMESTAMP)",
+            (
+                alias_id,
+                output_id,
+                amount,
+            ),
+        )
+        await db.commit()
@@ -0,0 +1,40 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Parser for the Double Counter alt-account intrusion alerts
+
+Version: 5.5.0
+"""
+import re
+
+# Double Counter starts its alerts with either form of the red triangle
+ALERT_PREFIXES = (
+    "🔺 Alt-account intrusion",
+    ":small_red_triangle: Alt-account intrusion",
+)
+
+# The main account is the last Discord ID (snowflake) mentioned in the alert, the
+# greedy prefix makes a single search land on it
+MAIN_ACCOUNT_ID = re.compile(r".*\b(\d{15,20})\b", re.DOTALL)
+
+
+def is_alert(content):
+    """
+    Check if a message is an alt-account intrusion alert.
+
+    :param content: The content of the message.
+    """
+    return content.startswith(ALERT_PREFIXES)
+
+
+def parse_main_account_id(content):
+    """
+    Get the ID of the main account from an alt-account intrusion alert.
+
+    :param content: The content of the message.
+    :return: The ID of the main account, or None if the message is not an alert or has no ID.
+    """
+    if not is_alert(content):
+        return None
+    match = MAIN_ACCOUNT_ID.match(content)
+    return int(match.group(1)) if match else None
@@ -8,7 +8,8 @@ Version: 5.5.0
 import discord
 import logging
 import helpers.configuration_manager as configuration_manager
-import re
+from helpers import db_manager
+from helpers.dc_alert_parser import parse_main_account_id
 
 logger = logging.getLogger("discord_bot")
 
@@ -18,35 +19,29 @@ dc_bot_channel = config["dc_bot_channel"]
 
 
 async def ban_main_account(message):
-    # Define the message part input that triggers the bot
-    dc_message_content = str("🔺 Alt-account intrusion")
-    dc_message_content_string = str(":small_red_triangle: Alt-account intrusion")
-
-    # Read the mesage
-    logger.debug("Reading the message")
-    logger.debug(message.content)
-    logger.debug(dc_message_content)
+    """
+    Ban the main account named in a Double Counter alt-account intrusion alert.
+
+    Alerts about an account that was already banned are dropped before any API call.
+
+    :param message: A message of a Double Counter channel.
+    """
+    if not message.author.bot:
+        return
+    userid_to_ban = parse_main_account_id(message.content)
+    if userid_to_ban is None:
+        return
+
+    guild_id = message.guild.id
+    if not await db_manager.add_banned_account(guild_id, userid_to_ban):
+        logger.debug("User %s is already banned", userid_to_ban)
+        return
+
     try:
-        if message.content.startswith(dc_message_content) or message.content.startswith(dc_message_content_string):
-            if message.author.bot:
-                logger.debug("User matched")
-                dc_verify_message = message.content.casefold()
-
-                temp = re.findall(r'\d+', dc_verify_message)
-                res = list(map(int, temp))
-                for i in range(0, len(res)):
-                    if i == (len(res)-1):
-                        continue
-                res.reverse()
-                
-                await message.channel.send("Banning main account\n Bye bye " + str(res[0]))
-                userid_to_ban = int(res[0])
-                        
-                await message.guild.ban(discord.Object(id=userid_to_ban))
-                logger.info("User %s is gone" % str(userid_to_ban))
-            else:
-                logger.info("This is NOT an alt account message")
-    
+        await message.channel.send("Banning main account\n Bye bye " + str(userid_to_ban))
+        await message.guild.ban(discord.Object(id=userid_to_ban))
+        logger.info("User %s is gone" % str(userid_to_ban))
     except Exception as e:
-        # Handle the exception here
-        logger.error(f"An exception occurred: {e}")
\ No newline at end of file
+        # Forget the ban so the next alert tries again
+        await db_manager.remove_banned_account(guild_id, userid_to_ban)
+        logger.error(f"An exception occurred: {e}")
@@ -6,17 +6,22 @@ This file contains functions for the Shimmer data
 Version: 5.4
 """
 
-import pickle
 import discord
+from helpers.embed_cache import get_market_data_embed
+from helpers.smr_market_data.smd_assets import assets
+from helpers.smr_market_data_embed import refresh_interval_hours
 
 
 async def create_empty_embed_and_messages():
-    embed = discord.Embed(title="Shimmer Market Data", color=0x00FF00)
+    for asset in assets:
+        embed = discord.Embed(title=f"{asset.name} Market Data", color=0x00FF00)
 
-    embed.add_field(name="Updates: ", value="Every 24h")
-    embed.add_field(
-        name="❌ Market Data not available yet: ",
-        value="Please have patience, the data will be available soon.",
-    )
-    with open("assets/embed_shimmer_market_data.pkl", "wb") as f:
-        pickle.dump(embed, f)
\ No newline at end of file
+        embed.add_field(name="Updates: ", value=f"Every {refresh_interval_hours}h")
+        embed.add_field(
+            name="❌ Market Data not available yet: ",
+            value="Please have patience, the data will be available soon.",
+        )
+        # Only a placeholder until the first market data embed of the asset is available
+        market_data_embed = get_market_data_embed(asset.key)
+        if market_data_embed.get() is None:
+            market_data_embed.publish(embed)
\ No newline at end of file
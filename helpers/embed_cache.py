@@ -0,0 +1,75 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+In-memory, versioned cache of the last good embeds served by the bot commands
+
+Version: 5.5.0
+"""
+import logging
+import time
+from collections import namedtuple
+
+logger = logging.getLogger("discord_bot")
+
+CachedEmbed = namedtuple("CachedEmbed", ["version", "embed", "published_at"])
+
+
+class EmbedCache:
+    """
+    Holds the last good version of an embed in memory.
+
+    A new version replaces the previous one with a single reference swap, so readers
+    always get a complete embed without any I/O. A failed refresh simply does not
+    publish, which leaves the previous version in place.
+    """
+
+    def __init__(self):
+        self._entry = None
+
+    @property
+    def version(self):
+        entry = self._entry
+        return entry.version if entry is not None else 0
+
+    def get(self):
+        """
+        Get the current embed, or None if nothing has been published yet.
+        """
+        entry = self._entry
+        return entry.embed if entry is not None else None
+
+    def get_entry(self):
+        """
+        Get the current embed together with its version and publication time.
+        """
+        return self._entry
+
+    def publish(self, embed):
+        """
+        Make the embed the current version.
+
+        :param embed: The new embed.
+        :return: The version number of the embed.
+        """
+        version = self.version + 1
+        self._entry = CachedEmbed(version, embed, time.time())
+        logger.debug("Published embed version %s", version)
+        return version
+
+
+# Market data embeds served by /smr-market, by asset key
+market_data_embeds = {}
+
+
+def get_market_data_embed(asset_key):
+    """
+    Get the market data embed cache of an asset, created the first time it is requested.
+
+    :param asset_key: The key of the asset, see smd_assets.
+    :return: The EmbedCache of the asset.
+    """
+    cache = market_data_embeds.get(asset_key)
+    if cache is None:
+        cache = EmbedCache()
+        market_data_embeds[asset_key] = cache
+    return cache
@@ -5,71 +5,128 @@ Currency formatting functions
 Version: 5.5.0
 """
 import logging
-import datetime
+import math
+import time
+import helpers.configuration_manager as configuration_manager
 
 logger = logging.getLogger("discord_bot")
 
-async def format_currency(value, currency_symbol="$"):
+# Load configuration
+config = configuration_manager.load_config('config.json')
+thousands_separator = config.get("number_thousands_separator", ",")
+decimal_separator = config.get("number_decimal_separator", ".")
+
+# Python formats with ',' and '.', they are swapped for the configured separators in one pass
+_SEPARATORS = str.maketrans({",": thousands_separator, ".": decimal_separator})
+_DEFAULT_SEPARATORS = thousands_separator == "," and decimal_separator == "."
+
+# Significant digits shown for amounts below 1, e.g. the price of a token
+SIGNIFICANT_DIGITS = 4
+
+# Units of compact numbers, largest first
+COMPACT_UNITS = (
+    (1e12, "T"),
+    (1e9, "B"),
+    (1e6, "M"),
+    (1e3, "K"),
+)
+
+# Glow per SMR
+GLOW_PER_SMR = 1000000
+
+
+def _decimals_for(value, significant_digits):
+    if value == 0:
+        return 0
+    return max(0, significant_digits - 1 - math.floor(math.log10(abs(value))))
+
+
+def _compact(value, decimals):
+    magnitude = abs(round(value, decimals))
+    for index, (threshold, unit) in enumerate(COMPACT_UNITS):
+        if magnitude >= threshold:
+            scaled = value / threshold
+            # 999,999 rounds to 1000.00K, show it as 1.00M instead
+            if abs(round(scaled, decimals)) >= 1000 and index > 0:
+                threshold, unit = COMPACT_UNITS[index - 1]
+                scaled = value / threshold
+            return scaled, unit
+    return value, ""
+
+
+def format_number(value, decimals=2, significant_digits=None, compact=False):
     """
-    Format the given numerical value as a currency string with commas as thousands separators and a specified
-    currency symbol.
+    Format a number with thousands separators.
 
     Args:
-        value (float): The numerical value to be formatted as currency.
-        currency_symbol (str, optional): The symbol to be used for the currency. Defaults to "$".
+        value (float): The number, strings such as '1e-05' are accepted as well.
+        decimals (int, optional): Number of decimal places. Defaults to 2.
+        significant_digits (int, optional): Round to this many significant digits instead
+                                            of a fixed number of decimal places.
+        compact (bool, optional): Show large numbers with a unit, e.g. 1.23M. Defaults to False.
 
     Returns:
-        str: Formatted currency string.
+        str: Formatted number.
     """
-    # logger.info("Formatting for USD currency")
-    # Split integer and decimal parts if there is a decimal point
-    parts = str(value).split('.')
-    integer_part = parts[0]
-    decimal_part = parts[1] if len(parts) > 1 else ""
+    value = float(value)
+    if not math.isfinite(value):
+        return str(value)
 
-    # Determine the number of decimal places based on the value
-    num_decimal_places = 2 if int(integer_part) > 0 else 5
+    unit = ""
+    if compact:
+        value, unit = _compact(value, decimals)
+    if significant_digits is not None:
+        decimals = _decimals_for(value, significant_digits)
 
-    # Limit decimal part to the specified number of digits
-    if decimal_part and len(decimal_part) > num_decimal_places:
-        decimal_part = decimal_part[:num_decimal_places]
+    formatted_value = f"{value:,.{decimals}f}"
+    if not _DEFAULT_SEPARATORS:
+        formatted_value = formatted_value.translate(_SEPARATORS)
+    return formatted_value + unit
 
-    # Format integer part with commas
-    formatted_integer_part = ""
-    for i in range(len(integer_part), 0, -3):
-        formatted_integer_part = "," + integer_part[max(i-3, 0):i] + formatted_integer_part
 
-    # Remove leading comma if present
-    if formatted_integer_part and formatted_integer_part[0] == ",":
-        formatted_integer_part = formatted_integer_part[1:]
+def format_currency(value, currency_symbol="$", compact=False):
+    """
+    Format the given numerical value as a currency string with thousands separators and a specified
+    currency symbol.
 
-    # Combine integer and decimal parts with appropriate separator
-    formatted_value = formatted_integer_part + ("." + decimal_part if decimal_part else "")
+    Amounts of 1 and more get 2 decimal places, smaller amounts are shown with
+    SIGNIFICANT_DIGITS significant digits so e.g. 0.00001234 does not become 0.00.
 
-    # Add the currency symbol and return the formatted string
+    Args:
+        value (float): The numerical value to be formatted as currency.
+        currency_symbol (str, optional): The symbol to be used for the currency. Defaults to "$".
+        compact (bool, optional): Show large amounts with a unit, e.g. $ 1.23M. Defaults to False.
+
+    Returns:
+        str: Formatted currency string.
+    """
+    value = float(value)
+    if math.isfinite(value) and abs(value) < 1:
+        # Pick the format on the rounded value, 0.9999999 rounds up to 1.00
+        value = round(value, _decimals_for(value, SIGNIFICANT_DIGITS))
+    if abs(value) >= 1 or value == 0 or not math.isfinite(value):
+        formatted_value = format_number(value, decimals=2, compact=compact)
+    else:
+        formatted_value = format_number(value, significant_digits=SIGNIFICANT_DIGITS)
     return f"{currency_symbol} {formatted_value}"
 
 
-async def format_shimmer_amount(value):
+def format_shimmer_amount(value, compact=False):
     """
-    Format the given numerical value representing Shimmer tokens as a string with 2 decimal places.
+    Format the given amount of glow as a SMR currency string.
 
     Args:
-        value (float): The numerical value to be formatted as Shimmer tokens.
+        value (int): The amount of glow, 1 SMR is 1,000,000 glow.
+        compact (bool, optional): Show large amounts with a unit, e.g. SMR 1.23M. Defaults to False.
 
     Returns:
-        str: Formatted Shimmer token string with 2 decimal places.
+        str: Formatted Shimmer token string.
+    """
+    return format_currency(float(value) / GLOW_PER_SMR, "SMR", compact=compact)
+
+
+def generate_discord_timestamp():
+    """
+    Get the current time in Discord timestamp format, shown in the local time of each reader.
     """
-    # logger.info("Formatting glow to SMR")
-    # Convert the number to a float and then format it with 2 decimal places
-    formatted_value = '{:.2f}'.format(float(value) / 1000000)
-    return formatted_value
-
-
-async def generate_discord_timestamp():
-    current_time = datetime.datetime.now()
-    # Convert current time to UNIX timestamp
-    unix_timestamp = int(current_time.timestamp())
-    # Format the current time in Discord timestamp format
-    timestamp = current_time.strftime(f'<t:{unix_timestamp}:f>')
-    return timestamp
\ No newline at end of file
+    return f"<t:{int(time.time())}:f>"
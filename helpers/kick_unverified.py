@@ -1,39 +1,355 @@
 """"
 Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
 Description:
-Kick Double Counter unverified group members that DCounter was not able to kick
+Kick Double Counter unverified group members that DCounter was not able to kick.
+Members are tracked from the moment they get the unverified role and kicked when their
+grace period runs out.
 
 Version: 5.5.0
 """
 import discord
 import logging
+import time
 import helpers.configuration_manager as configuration_manager
+from helpers import db_manager
 import asyncio
+import heapq
 
 logger = logging.getLogger("discord_bot")
 
 # Load configuration
 config = configuration_manager.load_config('config.json')
 unverified_role_name = config["unverified_role_name"]
-unverified_role_id = config["unverified_role_id"]
-verified_role_id = config["verified_role_id"]
-
-async def kick_unverified_accounts(bot):
-    # Find the specific role by its name or ID
-    specific_role = discord.utils.get(bot.guilds[0].roles, name=unverified_role_name) or bot.guilds[0].get_role(unverified_role_id)
-    
-    # Get all members with the specific role
-    members_with_role = specific_role.members
-
-    # Wait for 30 seconds for each member with the specific role and kick them
-    for member in members_with_role:
-        logger.debug(f"Member id: {member.id}")
-        if discord.utils.get(member.roles, id=verified_role_id): # has Turing test passed
-            # Member has verfied role, remove unverified role if present
-            if discord.utils.get(member.roles, id=unverified_role_id):
-                await member.remove_roles(bot.guilds[0].get_role(unverified_role_id))
+unverified_role_id = int(config["unverified_role_id"])
+verified_role_id = int(config["verified_role_id"])
+# Number of kicks and role removals in flight, discord.py paces them to the rate limit buckets
+prune_concurrency = config.get("prune_concurrency", 5)
+# Time an unverified member has to pass the Turing test, counted from when they joined
+grace_period = config.get("unverified_grace_period_hours", 8) * 60 * 60
+
+KICK = "kick"
+REMOVE_UNVERIFIED_ROLE = "remove_unverified_role"
+# Seconds before the kicks of expired members are tried again after an error
+RETRY_DELAY = 60
+KICK_REASON = "Verification not completed, please join again and verify your account. https://discord.gg/iota"
+
+# Members handled per second by the last drain, used to estimate the next one
+_last_prune_rate = None
+# Only one drain runs at a time, it picks up the tasks queued while it runs
+_drain_lock = asyncio.Lock()
+
+
+class DrainEstimator:
+    """
+    Measures the prune throughput and estimates when the queue will be empty.
+    """
+
+    def __init__(self, pending):
+        self.pending = pending
+        self.done = 0
+        self.started = time.monotonic()
+
+    def record(self):
+        self.done += 1
+        self.pending -= 1
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        if self.done == 0 or elapsed <= 0:
+            return _last_prune_rate
+        return self.done / elapsed
+
+    def eta(self):
+        """
+        Get the estimated seconds until the queue is drained, or None before any throughput is known.
+        """
+        rate = self.rate
+        if not rate:
+            return None
+        return self.pending / rate
+
+
+def _format_eta(seconds):
+    if seconds is None:
+        return "unknown"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes}m {seconds}s"
+
+
+def _find_unverified_role(guild):
+    return discord.utils.get(guild.roles, name=unverified_role_name) or guild.get_role(unverified_role_id)
+
+
+def _is_verified(member):
+    return discord.utils.get(member.roles, id=verified_role_id) is not None
+
+
+def _deadline(member):
+    joined_at = member.joined_at.timestamp() if member.joined_at is not None else time.time()
+    return int(joined_at + grace_period)
+
+
+class UnverifiedTracker:
+    """
+    Keeps the kick deadline of every unverified member.
+
+    Deadlines are updated from the member events and kept in a heap, so the next
+    kick is always known without scanning the role. They are also saved in the
+    database so a restart keeps them.
+    """
+
+    def __init__(self):
+        self.bot = None
+        # (guild_id, user_id) -> deadline, heap entries not matching it are stale
+        self.deadlines = {}
+        self._heap = []
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    async def start(self, bot):
+        """
+        Load the saved deadlines, catch up with the members that changed while the
+        bot was offline and start kicking members when their deadline passes.
+        """
+        self.bot = bot
+        if self._task is None:
+            for guild_id, user_id, deadline in await db_manager.get_unverified_deadlines():
+                self._schedule(guild_id, user_id, deadline)
+            self._task = asyncio.create_task(self._run())
+        await self.reconcile()
+        # Resume the kicks and role removals left over by the previous run
+        await drain_prune_queue(bot)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def reconcile(self):
+        """
+        Compare the tracked members with the unverified role of every guild.
+
+        The changes are written in one batch per table and the role removals are
+        handled by a single drain of the prune queue.
+        """
+        tracked = set(self.deadlines)
+        untracked = []
+        prune_tasks = []
+        deadlines = []
+        for guild in self.bot.guilds:
+            unverified_role = _find_unverified_role(guild)
+            if unverified_role is None:
+                continue
+            for member in unverified_role.members:
+                tracked.discard((guild.id, member.id))
+                untrack, prune_task, deadline = self._check_member(member)
+                if untrack:
+                    untracked.append((guild.id, member.id))
+                if prune_task is not None:
+                    prune_tasks.append(prune_task)
+                if deadline is not None:
+                    deadlines.append((guild.id, member.id, deadline))
+
+        # Members that left or lost the role while the bot was offline
+        untracked.extend(tracked)
+        if untracked:
+            await self._untrack(untracked)
+        if deadlines:
+            await db_manager.set_unverified_deadlines(deadlines)
+            for guild_id, user_id, deadline in deadlines:
+                self._schedule(guild_id, user_id, deadline)
+        if prune_tasks:
+            await db_manager.add_prune_tasks(prune_tasks)
+            await drain_prune_queue(self.bot)
+        logger.info("Tracking %s unverified members", len(self.deadlines))
+
+    async def update_member(self, member):
+        """
+        Track, stop tracking or clean up a member after their roles changed.
+        """
+        untrack, prune_task, deadline = self._check_member(member)
+        if untrack:
+            await self._untrack([(member.guild.id, member.id)])
+        if prune_task is not None:
+            await db_manager.add_prune_tasks([prune_task])
+            await drain_prune_queue(self.bot)
+        if deadline is not None:
+            await db_manager.set_unverified_deadlines([(member.guild.id, member.id, deadline)])
+            self._schedule(member.guild.id, member.id, deadline)
+            logger.debug("Kicking unverified member %s at %s", member.id, deadline)
+
+    def _check_member(self, member):
+        """
+        Decide what has to change for a member.
+
+        :return: Whether to stop tracking the member, the prune task to queue or None,
+                 and the deadline to track or None.
+        """
+        unverified_role = _find_unverified_role(member.guild)
+        key = (member.guild.id, member.id)
+        tracked = key in self.deadlines
+        if unverified_role is None or unverified_role not in member.roles:
+            return tracked, None, None
+
+        if _is_verified(member):
+            # Passed the Turing test, only the unverified role has to go
+            return tracked, (member.guild.id, member.id, REMOVE_UNVERIFIED_ROLE), None
+        if not tracked:
+            return False, None, _deadline(member)
+        return False, None, None
+
+    async def remove_member(self, member):
+        key = (member.guild.id, member.id)
+        if key in self.deadlines:
+            await self._untrack([key])
+
+    def _schedule(self, guild_id, user_id, deadline):
+        self.deadlines[(guild_id, user_id)] = deadline
+        heapq.heappush(self._heap, (deadline, guild_id, user_id))
+        if self._heap[0][0] == deadline:
+            # The new deadline comes first, the sleeping loop has to wake up earlier
+            self._wakeup.set()
+
+    async def _untrack(self, keys):
+        for key in keys:
+            self.deadlines.pop(key, None)
+        await db_manager.remove_unverified_deadlines(list(keys))
+
+    def _pop_expired(self, now):
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, guild_id, user_id = heapq.heappop(self._heap)
+            if self.deadlines.get((guild_id, user_id)) == deadline:
+                expired.append((guild_id, user_id))
+        return expired
+
+    async def _run(self):
+        while True:
+            expired = self._pop_expired(time.time())
+            if expired:
+                try:
+                    await db_manager.add_prune_tasks([(guild_id, user_id, KICK) for guild_id, user_id in expired])
+                    await self._untrack(expired)
+                    await drain_prune_queue(self.bot)
+                except Exception:
+                    # E.g. a locked database, the members are kicked by the next attempt
+                    logger.exception("Could not kick %s expired unverified members, retrying in %ss", len(expired), RETRY_DELAY)
+                    # Queuing the same task again is harmless and the kick checks the member once more
+                    for guild_id, user_id in expired:
+                        self._schedule(guild_id, user_id, int(time.time()) + RETRY_DELAY)
+                    await asyncio.sleep(RETRY_DELAY)
+                continue
+
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+unverified_tracker = UnverifiedTracker()
+
+
+async def drain_prune_queue(bot):
+    """
+    Handle every queued prune task, including the ones left over by a previous run.
+
+    Each task is removed from the database once it has been handled, so a restart
+    resumes where the previous run stopped. Tasks queued while a drain is running
+    are handled by that drain.
+    """
+    if _drain_lock.locked():
+        return
+    async with _drain_lock:
+        attempted = set()
+        while True:
+            pending = [
+                prune_task for prune_task in await db_manager.get_prune_tasks()
+                if prune_task[:2] not in attempted
+            ]
+            if not pending:
+                return
+            attempted.update(prune_task[:2] for prune_task in pending)
+            await _drain(bot, pending)
+
+
+async def _drain(bot, pending):
+    global _last_prune_rate
+
+    queue = asyncio.Queue()
+    for prune_task in pending:
+        queue.put_nowait(prune_task)
+
+    estimator = DrainEstimator(len(pending))
+    logger.info(
+        "Pruning %s unverified members, estimated time to drain: %s",
+        len(pending), _format_eta(estimator.eta()),
+    )
+
+    workers = [
+        asyncio.create_task(_prune_worker(bot, queue, estimator))
+        for _ in range(min(prune_concurrency, len(pending)))
+    ]
+    await asyncio.gather(*workers)
+
+    _last_prune_rate = estimator.rate
+    logger.info(
+        "Pruned %s unverified members in %.0fs, %s left in the queue",
+        estimator.done, time.monotonic() - estimator.started, await db_manager.count_prune_tasks(),
+    )
+
+
+async def _prune_worker(bot, queue, estimator):
+    while True:
+        try:
+            guild_id, user_id, action = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+
+        if await _prune_member(bot, guild_id, user_id, action):
+            await db_manager.remove_prune_task(guild_id, user_id)
+        estimator.record()
+
+        if estimator.done % 50 == 0:
+            logger.info(
+                "Prune queue: %s left, estimated time to drain: %s",
+                estimator.pending, _format_eta(estimator.eta()),
+            )
+
+
+async def _prune_member(bot, guild_id, user_id, action):
+    """
+    Kick a member or remove their unverified role.
+
+    :return: True if the task is done, False if it should be retried by the next run.
+    """
+    guild = bot.get_guild(guild_id)
+    member = guild.get_member(user_id) if guild is not None else None
+    if member is None:
+        # The member left or the bot is not in the guild anymore, nothing to do
+        return True
+
+    # The member may have verified since the task was queued
+    verified = _is_verified(member)
+    try:
+        if action == KICK and not verified:
+            await member.kick(reason=KICK_REASON)
+            logger.info("%s kicked (ID: %s)", member, member.id)
         else:
-            # Member does not have verified role, kick them
-            await asyncio.sleep(5)
-            await member.kick(reason="Verification not completed, please join again and verify your account. https://discord.gg/iota")
-            logger.info(member, "kicked", member.id)
\ No newline at end of file
+            unverified_role = _find_unverified_role(guild)
+            if unverified_role in member.roles:
+                await member.remove_roles(unverified_role)
+        return True
+
+    except discord.NotFound:
+        return True
+    except discord.Forbidden:
+        logger.error("Permission denied to prune member %s in guild %s", user_id, guild_id)
+        return True
+    except discord.HTTPException as e:
+        logger.error("Could not prune member %s in guild %s, retrying next run: %s", user_id, guild_id, e)
+        return False
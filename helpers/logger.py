@@ -6,7 +6,17 @@ Separated the logger to use in it helper functions
 Version: 5.5.0
 """
 
+import atexit
 import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+LOG_FILE = "discord.log"
+# Size of the log file before it is rotated, and number of rotated files kept
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 5
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 # Setup both of the loggers
 
@@ -30,30 +40,78 @@ class LoggingFormatter(logging.Formatter):
         logging.CRITICAL: red + bold,
     }
 
-    def format(self, record):
-        log_color = self.COLORS[record.levelno]
+    def __init__(self):
+        super().__init__()
+        # One formatter per level, built once
+        self.formatters = {
+            level: logging.Formatter(self._colored_format(color), DATE_FORMAT, style="{")
+            for level, color in self.COLORS.items()
+        }
+
+    def _colored_format(self, log_color):
         format = "(black){asctime}(reset) (levelcolor){levelname:<8}(reset) (green){name}(reset) {message}"
         format = format.replace("(black)", self.black + self.bold)
         format = format.replace("(reset)", self.reset)
         format = format.replace("(levelcolor)", log_color)
         format = format.replace("(green)", self.green + self.bold)
-        formatter = logging.Formatter(format, "%Y-%m-%d %H:%M:%S", style="{")
+        return format
+
+    def format(self, record):
+        formatter = self.formatters.get(record.levelno, self.formatters[logging.INFO])
         return formatter.format(record)
 
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Puts the records on the queue without formatting them, the message is built by
+    the listener thread. Only the traceback is rendered right away, as it refers to
+    frames of the calling thread.
+
+    Arguments passed to the loggers must therefore not be modified after the call.
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
 def setup_logger():
-    logger = logging.getLogger("discord_bot")
-    logger.setLevel(logging.INFO)
+    """
+    Send the records of the bot and discord.py loggers through a queue, the console
+    and the file are written to by a background thread instead of the event loop.
+
+    :return: The listener writing the records, it is stopped when the bot exits.
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = DeferredQueueHandler(log_queue)
+    for name in ("discord_bot", "discord"):
+        logger = logging.getLogger(name)
+        logger.setLevel(logging.INFO)
+        logger.addHandler(queue_handler)
 
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setFormatter(LoggingFormatter())
-    # File handler
-    file_handler = logging.FileHandler(filename="discord.log", encoding="utf-8", mode="w")
+    # File handler, the log of the previous run is kept as the first backup
+    file_handler = RotatingFileHandler(
+        filename=LOG_FILE,
+        encoding="utf-8",
+        maxBytes=LOG_FILE_MAX_BYTES,
+        backupCount=LOG_FILE_BACKUP_COUNT,
+        delay=True,
+    )
+    if os.path.isfile(LOG_FILE) and os.path.getsize(LOG_FILE) > 0:
+        file_handler.doRollover()
     file_handler_formatter = logging.Formatter(
-        "[{asctime}] [{levelname:<8}] {name}: {message}", "%Y-%m-%d %H:%M:%S", style="{"
+        "[{asctime}] [{levelname:<8}] {name}: {message}", DATE_FORMAT, style="{"
     )
     file_handler.setFormatter(file_handler_formatter)
 
-    # Add the handlers
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    # Write the records from a background thread
+    listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
@@ -0,0 +1,60 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Routes the messages of the monitored channels to their handlers with a single lookup
+
+Version: 5.5.0
+"""
+import logging
+
+logger = logging.getLogger("discord_bot")
+
+
+class MessageRouter:
+    """
+    Dispatch table mapping channel IDs to the coroutine functions handling their messages.
+
+    The bot and the cogs register their handlers once, a message in any other channel
+    costs a single dictionary lookup.
+    """
+
+    def __init__(self):
+        self._routes = {}
+
+    def register(self, channel_id, handler):
+        """
+        Call the handler with every message sent in the channel.
+
+        :param channel_id: The ID of the channel, as an int or a string.
+        :param handler: Coroutine function taking the message.
+        """
+        handlers = self._routes.setdefault(int(channel_id), [])
+        if handler not in handlers:
+            handlers.append(handler)
+
+    def unregister(self, channel_id, handler):
+        """
+        Stop calling the handler with the messages of the channel.
+        """
+        channel_id = int(channel_id)
+        handlers = self._routes.get(channel_id, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self._routes.pop(channel_id, None)
+
+    async def dispatch(self, message):
+        """
+        Hand the message to the handlers registered for its channel.
+
+        :param message: The message that was sent.
+        """
+        handlers = self._routes.get(message.channel.id)
+        if handlers is None:
+            return
+        for handler in tuple(handlers):
+            try:
+                await handler(message)
+            except Exception:
+                # Partials and callable objects have no __name__
+                logger.exception("Message handler %s failed", getattr(handler, "__qualname__", repr(handler)))
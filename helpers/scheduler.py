@@ -0,0 +1,93 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Periodic jobs running inside the bot event loop
+
+Version: 5.5.0
+"""
+import asyncio
+import logging
+import random
+import traceback
+
+logger = logging.getLogger("discord_bot")
+
+
+class PeriodicJob:
+    """
+    Runs a coroutine function at a fixed interval with some random jitter.
+
+    Runs never overlap: a run that is due, or requested, while the previous one is
+    still in progress is skipped.
+    """
+
+    def __init__(self, name, job, interval, jitter=0, run_at_start=True):
+        """
+        :param name: Human readable name of the job, used in the logs.
+        :param job: Coroutine function that is run.
+        :param interval: Seconds between the end of a run and the start of the next one.
+        :param jitter: Maximum number of seconds each interval is randomly shortened or lengthened by.
+        :param run_at_start: Whether the first run happens right away or after one interval.
+        """
+        self.name = name
+        self.job = job
+        self.interval = interval
+        self.jitter = jitter
+        self.run_at_start = run_at_start
+        self._lock = asyncio.Lock()
+        self._task = None
+
+    @property
+    def is_running(self):
+        """
+        Whether a run is in progress.
+        """
+        return self._lock.locked()
+
+    def start(self):
+        """
+        Start scheduling the job in the running event loop.
+        """
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._schedule())
+            logger.info("Scheduled %s every %ss (±%ss)", self.name, self.interval, self.jitter)
+
+    async def stop(self):
+        """
+        Stop scheduling the job, a run in progress is cancelled.
+        """
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_once(self):
+        """
+        Run the job now, unless a run is already in progress.
+
+        :return: The result of the job, or None if the run was skipped or failed.
+        """
+        if self._lock.locked():
+            logger.info("Skipping %s, the previous run is still in progress", self.name)
+            return None
+
+        async with self._lock:
+            logger.info("Running %s", self.name)
+            try:
+                return await self.job()
+            except Exception:
+                logger.error("%s failed:\n%s", self.name, traceback.format_exc())
+                return None
+
+    def next_delay(self):
+        """
+        Get the number of seconds until the next run.
+        """
+        return max(0, self.interval + random.uniform(-self.jitter, self.jitter))
+
+    async def _schedule(self):
+        if self.run_at_start:
+            await self.run_once()
+        while True:
+            await asyncio.sleep(self.next_delay())
+            await self.run_once()
@@ -0,0 +1,101 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Assets tracked by the market data pipeline, read from "market_assets" in config.json
+Version: 5.5.0
+"""
+import logging
+from collections import namedtuple
+import helpers.configuration_manager as configuration_manager
+
+logger = logging.getLogger("discord_bot")
+
+# Load configuration
+config = configuration_manager.load_config('config.json')
+
+# Identifiers of an asset at each provider, a provider without one is skipped for the asset
+Asset = namedtuple(
+    "Asset",
+    [
+        "key",
+        "name",
+        "coingecko_coin_id",
+        "coingecko_exchange_id",
+        "defillama_chain",
+        "geckoterminal_network",
+        "shimmer_onchain_deposit_alias",
+        "bitfinex_tickers",
+    ],
+)
+
+
+def _legacy_asset(config):
+    """
+    The single Shimmer asset configured with the top-level keys of config.json.
+    """
+    return Asset(
+        key="smr",
+        name="Shimmer",
+        coingecko_coin_id=config.get("coingecko_coin_id"),
+        coingecko_exchange_id=config.get("coingecko_exchange_id"),
+        defillama_chain="ShimmerEVM",
+        geckoterminal_network=config.get("geckoterminal_ticker"),
+        shimmer_onchain_deposit_alias=config.get("shimmer_onchain_deposit_alias"),
+        bitfinex_tickers=tuple(config.get("bitfinex_tickers", ())),
+    )
+
+
+def load_assets(config):
+    """
+    Get the tracked assets from the configuration.
+
+    Args:
+        config (Mapping): The configuration.
+
+    Returns:
+        list: The Asset of every entry of "market_assets", or the Shimmer asset
+              configured with the top-level keys if there is no such list.
+    """
+    entries = config.get("market_assets")
+    if not entries:
+        return [_legacy_asset(config)]
+
+    assets = []
+    for entry in entries:
+        assets.append(Asset(
+            key=entry["key"],
+            name=entry.get("name", entry["key"]),
+            coingecko_coin_id=entry.get("coingecko_coin_id"),
+            coingecko_exchange_id=entry.get("coingecko_exchange_id"),
+            defillama_chain=entry.get("defillama_chain"),
+            geckoterminal_network=entry.get("geckoterminal_network"),
+            shimmer_onchain_deposit_alias=entry.get("shimmer_onchain_deposit_alias"),
+            bitfinex_tickers=tuple(entry.get("bitfinex_tickers", ())),
+        ))
+    return assets
+
+
+assets = load_assets(config)
+assets_by_key = {asset.key: asset for asset in assets}
+
+
+def get_asset(key=None):
+    """
+    Get a tracked asset.
+
+    Args:
+        key (str, optional): The key of the asset. Defaults to the first asset.
+
+    Returns:
+        Asset: The asset, or None if no asset has this key.
+    """
+    if key is None:
+        return assets[0]
+    return assets_by_key.get(key)
+
+
+def all_bitfinex_tickers():
+    """
+    Get the Bitfinex tickers of every asset, each one once.
+    """
+    return list(dict.fromkeys(ticker for asset in assets for ticker in asset.bitfinex_tickers))
@@ -1,21 +1,27 @@
 """"
 Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
 Description:
-Get API data for Shimmer from Bitfinex V2 API
+Get API data for the tracked assets from Bitfinex V2 API
 Version: 5.5.0
 """
-import requests
+import asyncio
+import aiohttp
 import logging
 import helpers.configuration_manager as configuration_manager
+from helpers.smr_market_data.smd_fetch import fetch_json
+from helpers.smr_market_data.smd_orderbook import OrderBook
+from helpers.smr_market_data.smd_livebook import get_synced_book
 
 logger = logging.getLogger("discord_bot")
 
 # Load configuration
 config = configuration_manager.load_config('config.json')
 
-# Shimmer data
-bitfinex_tickers = config["bitfinex_tickers"]
-percentage_levels = [-2, 2, -5, 5, -10, 10, -20, 20]
+percentage_levels = config.get("bitfinex_depth_levels", [-2, 2, -5, 5, -10, 10, -20, 20])
+# Number of price points requested per book, Bitfinex accepts 1, 25, 100 or 250
+bitfinex_book_length = config.get("bitfinex_book_length", 250)
+# Market order sizes (in SMR) for which the slippage of the consolidated book is reported
+slippage_sizes = config.get("bitfinex_slippage_sizes", [10000, 100000, 1000000])
 
 # Functions
 async def get_bitfinex_order_book_data(ticker):
@@ -30,143 +36,137 @@ async def get_bitfinex_order_book_data(ticker):
               The dictionary includes price, quantity, and other relevant information
               for both buy and sell orders in the order book.
     Raises:
-        requests.exceptions.RequestException: If there is an issue with the HTTP request to the Bitfinex API.
+        aiohttp.ClientError: If there is an issue with the HTTP request to the Bitfinex API.
     """
     # Make the API request to get order book data
-    url = f"https://api-pub.bitfinex.com/v2/book/{ticker}/R0?len=100"
+    url = f"https://api-pub.bitfinex.com/v2/book/{ticker}/R0?len={bitfinex_book_length}"
     headers = {"accept": "application/json"}
-    book_response = None
 
     try:
-        book_response = requests.get(url, headers=headers, timeout=10)
-        book_response.raise_for_status()  # Raise HTTPError for bad requests (4xx and 5xx status codes)
-        logger.debug("Bitfinex book response: %s", book_response.text)
+        order_book_data = await fetch_json(url, headers=headers)
+        logger.debug("Bitfinex book response: %s", order_book_data)
+        return order_book_data
 
-        if book_response.status_code == 200:
-            order_book_data = book_response.json()
-            return order_book_data
-
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         logger.error("Bitfinex API request timed out.")
-    except requests.exceptions.HTTPError as errh:
+    except aiohttp.ClientResponseError as errh:
         logger.error("HTTP Error occurred: %s", errh)
-    except requests.exceptions.RequestException as err:
+    except aiohttp.ClientError as err:
         logger.error("Request Exception occurred: %s", err)
 
 
-async def combine_bitfinex_order_book_data():
+async def combine_bitfinex_order_book_data(bitfinex_tickers):
     """
     Combine order book data for multiple Bitfinex tickers into a dictionary.
-    
+    Tickers followed by a synced live order book are taken from it, the order
+    books of all other tickers are requested concurrently.
+
+    Args:
+        bitfinex_tickers (list): The Bitfinex tickers of the asset, e.g. ['tSMRUSD'].
+
     Returns:
-        dict: A dictionary where keys are Bitfinex tickers, and values are dictionaries containing
-              order book data for each ticker. Each inner dictionary includes price, quantity,
-              and other relevant information for both buy and sell orders in the order book.
-    Raises:
-        requests.exceptions.RequestException: If there is an issue with the HTTP request to the Bitfinex API.
+        dict: A dictionary where keys are Bitfinex tickers, and values are the raw order book
+              entries of each ticker, or an OrderBook for tickers served by a live order book.
     """
     order_books_data = {}
 
-    try:
-        logger.debug("Bitfinex tickers: %s", bitfinex_tickers)
+    logger.debug("Bitfinex tickers: %s", bitfinex_tickers)
+    rest_tickers = []
+    for ticker in bitfinex_tickers:
+        live_book = get_synced_book(ticker)
+        if live_book is not None:
+            order_books_data[ticker] = live_book
+        else:
+            rest_tickers.append(ticker)
 
-        for ticker in bitfinex_tickers:
-            order_book_data = await get_bitfinex_order_book_data(ticker)
+    results = await asyncio.gather(*(get_bitfinex_order_book_data(ticker) for ticker in rest_tickers))
 
-            if order_book_data is not None:
-                order_books_data[ticker] = order_book_data
-                logger.debug("Order book data %s", order_book_data) 
+    for ticker, order_book_data in zip(rest_tickers, results):
+        if order_book_data is not None:
+            order_books_data[ticker] = order_book_data
+            logger.debug("Order book data %s", order_book_data)
 
-        return order_books_data
+    return order_books_data
 
-    except requests.exceptions.RequestException as err:
-        logger.error("Request Exception occurred: %s", err)
+
+def _as_order_book(orders):
+    return orders if isinstance(orders, OrderBook) else OrderBook.from_raw(orders)
 
 
-async def get_bitfinex_order_book_depth(usd_price):
+async def calculate_bitfinex_depth(usd_price, order_book):
     """
-    Get the order book depth for a list of Bitfinex tickers at various percentage levels.
-    
+    Calculate the order book depth of each Bitfinex ticker at the percentage levels, and
+    of the consolidated book of all tickers together with its spread, mid price and slippage.
+    The raw order books are converted once and used for both.
+
     Args:
-        tickers (list): A list of Bitfinex tickers for which order book depth is to be calculated.
         usd_price (float): The current USD price of the cryptocurrency.
-        
+        order_book (dict): The order books per ticker, as returned by combine_bitfinex_order_book_data().
+
     Returns:
-        dict: A dictionary containing order book depth for each ticker at different percentage levels.
-              The keys are tickers, and the values are dictionaries with buy and sell quantities
-              for each specified percentage level.
-    Raises:
-        requests.exceptions.RequestException: If there is an issue with the HTTP request to the Bitfinex API.
+        tuple: The depth per ticker, a dictionary with the buy and sell quantities of each
+               ticker at each percentage level, and the total depth, a dictionary with the
+               total buy and sell quantities of the consolidated book for each percentage
+               level next to its spread, mid price and slippage per order size.
+               Both are None if there is no order book or it is malformed.
     """
-    order_book = await combine_bitfinex_order_book_data()
-    order_book_depth = {}
+    logger.info("Calculating the Bitfinex Order Book Depth")
+
+    if not order_book:
+        logger.error("No Bitfinex order book available to calculate the depth")
+        return None, None
 
     try:
+        order_books = {ticker: _as_order_book(orders) for ticker, orders in order_book.items()}
+        order_book_depth = {
+            ticker: ticker_book.depth(usd_price, percentage_levels)
+            for ticker, ticker_book in order_books.items()
+        }
+        consolidated_book = OrderBook.merge(order_books.values())
+    except (IndexError, TypeError, ValueError) as err:
+        logger.error("Malformed Bitfinex order book: %s", err)
+        return None, None
 
-        # Iterate through tickers
-        for ticker, orders in order_book.items():
-            ticker_depth = {}
-
-            # Iterate percentage levels
-            for percentage in percentage_levels:
-                price_level = usd_price * (1 + percentage / 100)
-                # price_level = round(price_level, 2)  # Round to 2 decimal places to match order book granularity
-                buy_quantity = 0
-                sell_quantity = 0
-                logger.debug("Order book in function: %s", order_book)
-
-                # Iterate through the entries and collect order book values
-                for order in orders:
-                    price = order[1]
-                    amount = order[2]
-
-                    # If the order price is within the specified percentage range
-                    if price >= price_level and amount > 0:
-                        buy_quantity += amount
-                    elif price <= price_level and amount < 0:
-                        sell_quantity -= amount  # Convert negative amount to positive for sell orders
-
-                ticker_depth[f'{percentage}%'] = {'buy': buy_quantity, 'sell': sell_quantity}
-                logger.debug("Depth after for loop: %s", ticker_depth)
-            
-            order_book_depth[ticker] = ticker_depth
-
-        logger.debug(f"Order book depth: %s", order_book_depth)
-        return order_book_depth
-    
-    except requests.exceptions.RequestException as err:
-        logger.error("Request Exception occurred: %s", err)
+    logger.debug("Order book depth: %s", order_book_depth)
+    return order_book_depth, _total_depth(consolidated_book, usd_price)
 
 
-async def calculate_total_bitfinex_depth(usd_price):
+async def calculate_live_bitfinex_depth(bitfinex_tickers):
     """
-    Calculate the total Bitfinex order book depth by summing buy and sell quantities
-    for each percentage level across multiple tickers.
-    
+    Calculate the total order book depth from the live order books, around their mid price.
+
     Args:
-        tickers (list): A list of Bitfinex tickers for which total order book depth is to be calculated.
-        usd_price (float): The current USD price of the cryptocurrency.
-        
+        bitfinex_tickers (list): The Bitfinex tickers of the asset, e.g. ['tSMRUSD'].
+
     Returns:
-        dict: A dictionary containing the total order book depth for each percentage level.
-              The keys are percentage levels, and the values are dictionaries with total buy
-              and sell quantities across all specified tickers.
+        dict: The same total depth as calculate_bitfinex_depth(), or None unless every
+              ticker is followed by a synced live order book.
     """
-    logger.info("Calculating the total Bitfinex Order Book Depth")
-    order_book_depth = await get_bitfinex_order_book_depth(usd_price)
-    logger.debug("order_book_depth for calculate total: %s", order_book_depth)
-    total_order_book_depth = {}
-
-    # Iterate through percentage levels
-    for percentage, data in order_book_depth[list(order_book_depth.keys())[0]].items():
-        total_buy = 0
-        total_sell = 0
-
-        # Iterate through tickers and sum the buy and sell quantities for the current percentage level
-        for ticker, ticker_data in order_book_depth.items():
-            total_buy += ticker_data[percentage]['buy']
-            total_sell += ticker_data[percentage]['sell']
-            
-        # Add the total buy and sell quantities for the current percentage level to the result dictionary
-        total_order_book_depth[percentage] = {'buy': total_buy, 'sell': total_sell}
-    return {"total_order_book_depth":  total_order_book_depth}
\ No newline at end of file
+    live_order_books = [get_synced_book(ticker) for ticker in bitfinex_tickers]
+    if not live_order_books or any(book is None for book in live_order_books):
+        return None
+
+    consolidated_book = OrderBook.merge(live_order_books)
+    mid_price = consolidated_book.mid_price()
+    if mid_price is None:
+        return None
+    return _total_depth(consolidated_book, mid_price)
+
+
+def _total_depth(consolidated_book, usd_price):
+    total_order_book_depth = consolidated_book.depth(usd_price, percentage_levels)
+    buy_slippage = consolidated_book.slippage("buy", slippage_sizes).tolist()
+    sell_slippage = consolidated_book.slippage("sell", slippage_sizes).tolist()
+    slippage = {
+        size: {'buy': buy, 'sell': sell}
+        for size, buy, sell in zip(slippage_sizes, buy_slippage, sell_slippage)
+    }
+
+    total_depth = {
+        "total_order_book_depth": total_order_book_depth,
+        "spread": consolidated_book.spread(),
+        "mid_price": consolidated_book.mid_price(),
+        "slippage": slippage,
+    }
+    logger.debug("Total order book depth: %s", total_depth)
+    return total_depth
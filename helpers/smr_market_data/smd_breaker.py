@@ -0,0 +1,96 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Circuit breaker keeping failing market data providers from being requested at full rate
+Version: 5.5.0
+"""
+import logging
+import random
+import time
+
+logger = logging.getLogger("discord_bot")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitBreaker:
+    """
+    Tracks the failures of a provider.
+
+    After failure_threshold consecutive failures the circuit opens and the provider
+    is not requested until a jittered, exponentially growing backoff has passed.
+    Then a single probe request is let through (half-open): if it succeeds the
+    circuit closes, otherwise it opens again with a longer backoff.
+    """
+
+    def __init__(self, name, failure_threshold=2, base_backoff=60, max_backoff=3600):
+        """
+        :param name: The name of the provider, used in the logs.
+        :param failure_threshold: Consecutive failures opening the circuit.
+        :param base_backoff: Seconds the circuit stays open the first time.
+        :param max_backoff: Upper bound of the backoff in seconds.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0
+
+    @property
+    def is_open(self):
+        """
+        Whether requests to the provider are currently held back.
+        """
+        return self.state != CLOSED
+
+    def allow(self):
+        """
+        Check if the provider may be requested, a call that is allowed must be
+        followed by record_success(), record_failure() or release().
+        """
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.time() >= self.open_until:
+            self.state = HALF_OPEN
+            logger.info("Probing %s after its circuit was open", self.name)
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != CLOSED:
+            logger.info("Circuit of %s closed", self.name)
+        self.state = CLOSED
+        self.failures = 0
+        self.trips = 0
+
+    def release(self):
+        """
+        Give up an allowed call without an outcome, a probe is let through again by the next allow().
+        """
+        if self.state == HALF_OPEN:
+            self.state = OPEN
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._open()
+
+    def backoff(self):
+        """
+        Get the seconds the circuit stays open after the current number of trips.
+        """
+        backoff = min(self.base_backoff * 2 ** self.trips, self.max_backoff)
+        # Spread the retries of providers that failed at the same time
+        return random.uniform(backoff / 2, backoff)
+
+    def _open(self):
+        backoff = self.backoff()
+        self.trips += 1
+        self.state = OPEN
+        self.open_until = time.time() + backoff
+        logger.warning("Circuit of %s open for %.0fs after %s failures", self.name, backoff, self.failures)
@@ -0,0 +1,102 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Stale-while-revalidate cache of the market data sources, each source has its own time to live
+Version: 5.5.0
+"""
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+logger = logging.getLogger("discord_bot")
+
+CacheEntry = namedtuple("CacheEntry", ["value", "fetched_at"])
+
+
+def source_kind(name):
+    """
+    Get the provider of a source, sources of several assets are named e.g. 'geckoterminal:shimmerevm'.
+    """
+    return name.partition(":")[0]
+
+
+class SourceCache:
+    """
+    Keeps the last result of every market data source.
+
+    A result younger than the time to live of its source is served as is. Up to one
+    more time to live it is still served, while a refresh runs in the background.
+    Older results, or missing ones, are refreshed before they are served, and the
+    previous result is used if that refresh fails.
+
+    Concurrent requests for a source share a single refresh.
+    """
+
+    def __init__(self, ttls, run):
+        """
+        :param ttls: Providers mapped to their time to live in seconds, sources without one are not cached.
+        :param run: Coroutine function taking the source name and its coroutine function, returning None on failure.
+        """
+        self.ttls = ttls
+        self.run = run
+        self._entries = {}
+        self._refreshes = {}
+
+    async def get(self, name, fetch):
+        """
+        Get the data of a source.
+
+        :param name: The name of the source.
+        :param fetch: Coroutine function fetching the data of the source.
+        :return: The data, or None if the source failed and nothing is cached.
+        """
+        ttl = self.ttls.get(source_kind(name), 0)
+        entry = self._entries.get(name)
+        age = time.time() - entry.fetched_at if entry is not None else None
+
+        if age is not None and age < ttl:
+            return entry.value
+
+        refresh = self._refresh(name, fetch)
+        if age is not None and age < 2 * ttl:
+            logger.debug("Serving %s from cache while it is refreshed", name)
+            return entry.value
+
+        value = await asyncio.shield(refresh)
+        if value is None and entry is not None:
+            logger.warning("Serving the last %s data, fetched %.0fs ago", name, age)
+            return entry.value
+        return value
+
+    def fetched_at(self, name):
+        """
+        Get the UNIX time the cached data of a source was fetched, or None if nothing is cached.
+        """
+        entry = self._entries.get(name)
+        return entry.fetched_at if entry is not None else None
+
+    def invalidate(self, name=None):
+        """
+        Forget the cached data of a source, or of all sources.
+        """
+        if name is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(name, None)
+
+    def _refresh(self, name, fetch):
+        refresh = self._refreshes.get(name)
+        if refresh is None:
+            refresh = asyncio.create_task(self._fetch(name, fetch))
+            self._refreshes[name] = refresh
+        return refresh
+
+    async def _fetch(self, name, fetch):
+        try:
+            value = await self.run(name, fetch)
+            if value is not None and self.ttls.get(source_kind(name), 0) > 0:
+                self._entries[name] = CacheEntry(value, time.time())
+            return value
+        finally:
+            self._refreshes.pop(name, None)
@@ -0,0 +1,43 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Renders the market data charts, runs in a worker process so only the worker imports matplotlib
+Version: 5.5.0
+"""
+import datetime
+import io
+
+
+def render_chart(title, points):
+    """
+    Render a line chart of a metric.
+
+    Args:
+        title (str): The title of the chart.
+        points (list): The (ts, value) tuples to plot, ordered by time.
+
+    Returns:
+        bytes: The chart as a PNG image.
+    """
+    # Imported here so that the bot process, which only references this function, never loads matplotlib
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.dates as mdates
+    import matplotlib.pyplot as plt
+
+    times = [datetime.datetime.fromtimestamp(ts, tz=datetime.timezone.utc) for ts, _ in points]
+    values = [value for _, value in points]
+
+    figure, axes = plt.subplots(figsize=(8, 3.5), dpi=100)
+    try:
+        axes.plot(times, values, color="#00C853", linewidth=1.5, marker="o" if len(points) < 30 else None, markersize=3)
+        axes.set_title(title)
+        axes.grid(True, alpha=0.3)
+        axes.xaxis.set_major_formatter(mdates.ConciseDateFormatter(axes.xaxis.get_major_locator()))
+        figure.tight_layout()
+
+        image = io.BytesIO()
+        figure.savefig(image, format="png")
+        return image.getvalue()
+    finally:
+        plt.close(figure)
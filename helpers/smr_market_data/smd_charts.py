@@ -0,0 +1,110 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Charts of the stored market data, rendered in a worker process and cached until new data arrives
+Version: 5.5.0
+"""
+import asyncio
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from helpers import db_manager
+from helpers.smr_market_data.smd_chart_render import render_chart
+from helpers.smr_market_data.smd_history import RAW, HOURLY
+
+logger = logging.getLogger("discord_bot")
+
+# Chart windows mapped to their length in seconds and the resolution of the plotted points
+CHART_WINDOWS = {
+    "24h": (24 * 60 * 60, RAW),
+    "7d": (7 * 24 * 60 * 60, HOURLY),
+    "30d": (30 * 24 * 60 * 60, HOURLY),
+}
+
+# Metrics that are charted and their title, formatted with the Asset
+CHART_METRICS = {
+    "price_usd": "{asset.name} Price (USD)",
+    "tvl_usd": "{asset.defillama_chain} Total Value Locked (USD)",
+}
+
+# (stored metric, window) -> (timestamp of the last plotted point, PNG image)
+_chart_cache = {}
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        # A single worker is enough for a few charts per refresh, it is started on the
+        # first request and render_chart() does not touch any state of the bot. The bot
+        # runs the database and logging threads, so the worker is not forked from it.
+        # The worker imports the main module again, bot.py only starts the bot in run_bot()
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["helpers.smr_market_data.smd_chart_render"])
+        else:
+            # Windows only has spawn
+            context = multiprocessing.get_context("spawn")
+        _executor = ProcessPoolExecutor(max_workers=1, mp_context=context)
+    return _executor
+
+
+def shutdown_executor():
+    """
+    Stop the worker process rendering the charts.
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def get_chart(asset, metric, window):
+    """
+    Get the chart of a metric of an asset, it is only rendered again when a newer point was stored.
+
+    Args:
+        asset (Asset): The charted asset.
+        metric (str): One of CHART_METRICS.
+        window (str): One of CHART_WINDOWS.
+
+    Returns:
+        bytes: The chart as a PNG image, or None if there is no data in the window.
+    """
+    window_seconds, resolution = CHART_WINDOWS[window]
+    stored_metric = f"{asset.key}:{metric}"
+    points = await db_manager.get_market_snapshots(stored_metric, resolution, int(time.time()) - window_seconds)
+    if not points:
+        return None
+
+    last_ts = points[-1][0]
+    cached = _chart_cache.get((stored_metric, window))
+    if cached is not None and cached[0] == last_ts:
+        return cached[1]
+
+    title = f"{CHART_METRICS[metric].format(asset=asset)}, last {window}"
+    loop = asyncio.get_running_loop()
+    image = await loop.run_in_executor(_get_executor(), render_chart, title, points)
+    _chart_cache[(stored_metric, window)] = (last_ts, image)
+    logger.info("Rendered the %s chart of %s", window, stored_metric)
+    return image
+
+
+async def get_charts(asset, window):
+    """
+    Get the charts of every charted metric of an asset.
+
+    Args:
+        asset (Asset): The charted asset.
+        window (str): One of CHART_WINDOWS.
+
+    Returns:
+        list: (filename, PNG image) tuples of the metrics with data in the window.
+    """
+    images = await asyncio.gather(*(get_chart(asset, metric, window) for metric in CHART_METRICS))
+    return [
+        (f"{asset.key}_{metric}_{window}.png", image)
+        for metric, image in zip(CHART_METRICS, images)
+        if image is not None
+    ]
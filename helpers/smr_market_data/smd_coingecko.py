@@ -1,60 +1,64 @@
 """"
 Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
 Description:
-Get API data for Shimmer from CoinGecko API
+Get API data for the tracked assets from CoinGecko API
 Version: 5.5.0
 """
-import requests
+import asyncio
+import aiohttp
 import logging
-import helpers.configuration_manager as configuration_manager
+from helpers.smr_market_data.smd_fetch import fetch_json
 
 logger = logging.getLogger("discord_bot")
 
-# Load configuration
-config = configuration_manager.load_config('config.json')
 
-# Shimmer data
-coingecko_coin_id = config["coingecko_coin_id"]
-coingecko_exchange_id = config["coingecko_exchange_id"]
-
-
-async def get_coingecko_exchange_data():
+async def get_coingecko_exchange_data(exchange_id, coin_ids):
     """
-    Get Coingecko exchange data for Shimmer (SMR) cryptocurrency.
+    Get Coingecko exchange data for several cryptocurrencies with a single request.
+
+    Args:
+        exchange_id (str): The Coingecko ID of the exchange, e.g. 'bitfinex'.
+        coin_ids (list): The Coingecko IDs of the coins, e.g. ['shimmer'].
 
     Returns:
-        dict: A dictionary containing the latest USD price and 24h total volume for Shimmer.
-              Example: {"usd_price": 0.1234, "total_volume": 1234567.89}
+        dict: The coin IDs mapped to a dictionary containing the latest USD price and 24h total volume.
+              Example: {"shimmer": {"usd_price": 0.1234, "total_volume": 1234567.89}}
+              Coins without a USD ticker on the exchange are left out.
     Raises:
-        requests.exceptions.RequestException: If there is an issue with the HTTP request to the Coingecko API.
+        aiohttp.ClientError: If there is an issue with the HTTP request to the Coingecko API.
     """
-    logger.info("Getting the Coingecko Exchange data")
-    coingecko_exchange_url = f"https://api.coingecko.com/api/v3/exchanges/{coingecko_exchange_id}/tickers?coin_ids={coingecko_coin_id}"
+    logger.info("Getting the Coingecko Exchange data of %s", ", ".join(coin_ids))
+    coingecko_exchange_url = f"https://api.coingecko.com/api/v3/exchanges/{exchange_id}/tickers?coin_ids={','.join(coin_ids)}"
     headers = {"accept": "application/json"}
 
     try:
-        exchange_response = requests.get(coingecko_exchange_url, headers=headers, timeout=10)
-        exchange_response.raise_for_status()  # Raise HTTPError for bad requests (4xx and 5xx status codes)
-        logger.debug("Coingecko exchange response: %s", exchange_response.text)
+        exchange_response = await fetch_json(coingecko_exchange_url, headers=headers)
+        logger.debug("Coingecko exchange response: %s", exchange_response)
 
-        if exchange_response.status_code == 200:
-            tickers = exchange_response.json().get("tickers", [])
+        tickers_by_coin = {coin_id: [] for coin_id in coin_ids}
+        for ticker in exchange_response.get("tickers", []):
+            tickers_by_coin.setdefault(ticker.get("coin_id"), []).append(ticker)
+
+        exchange_data = {}
+        for coin_id in coin_ids:
+            tickers = tickers_by_coin[coin_id]
+            usd_price = next((ticker["last"] for ticker in tickers if ticker["target"] == "USD"), None)
+            if usd_price is None:
+                logger.warning("No USD ticker for %s on %s", coin_id, exchange_id)
+                continue
             usd_volume = sum(ticker["converted_volume"]["usd"] for ticker in tickers if ticker["target"] == "USD")
             usdt_volume = sum(ticker["converted_volume"]["usd"] for ticker in tickers if ticker["target"] == "USDT")
-            usd_price = next(ticker["last"] for ticker in tickers if ticker["target"] == "USD")
             twentyfourh_volume = usd_volume + usdt_volume
 
-            logger.debug("Last USD Price: %s", usd_price)
-            logger.debug("Total USD Converted Volume for Shimmer: %s", twentyfourh_volume)
-
-            return {"usd_price": usd_price, "total_volume": twentyfourh_volume}
+            logger.debug("Last USD Price of %s: %s", coin_id, usd_price)
+            logger.debug("Total USD Converted Volume for %s: %s", coin_id, twentyfourh_volume)
+            exchange_data[coin_id] = {"usd_price": usd_price, "total_volume": twentyfourh_volume}
 
-        else:
-            logger.debug("Error: Unable to fetch data from the API.")
+        return exchange_data or None
 
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         logger.error("Coingecko API request timed out.")
-    except requests.exceptions.HTTPError as errh:
+    except aiohttp.ClientResponseError as errh:
         logger.error("HTTP Error occurred: %s", errh)
-    except requests.exceptions.RequestException as err:
-        logger.error("Request Exception occurred: %s", err)
\ No newline at end of file
+    except aiohttp.ClientError as err:
+        logger.error("Request Exception occurred: %s", err)
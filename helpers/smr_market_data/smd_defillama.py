@@ -1,53 +1,76 @@
 """"
 Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
 Description:
-Get API data for Shimmer from DefiLlama API
+Get API data for the tracked assets from DefiLlama API
 Version: 5.5.0
 """
-import requests
+import asyncio
+import aiohttp
+import ijson
 import logging
-import helpers.configuration_manager as configuration_manager
+from contextlib import aclosing
+from helpers.smr_market_data.smd_fetch import fetch_json_items
 
 logger = logging.getLogger("discord_bot")
 
-# Load configuration
-config = configuration_manager.load_config('config.json')
 
-async def get_defillama_data():
+async def get_defillama_data(chain_names):
     """
-    Get DefiLlama TVL data for ShimmerEVM.
-    
+    Get DefiLlama TVL data for several chains out of the single chains payload.
+
+    The chains are read one at a time while the response is downloaded, the rank of
+    a chain is one more than the number of chains with a higher TVL, so chains with
+    the same TVL share a rank.
+
+    Args:
+        chain_names (list): The DefiLlama names of the chains, e.g. ['ShimmerEVM'].
+
     Returns:
-        dict: Dictionary containing ShimmerEVM TVL and rank.
+        dict: The chain names mapped to a dictionary containing their TVL and rank,
+              chains missing from the payload are left out.
     """
-    logger.info("Getting the DefiLlama TVL and rank")
+    logger.info("Getting the DefiLlama TVL and rank of %s", ", ".join(chain_names))
     defillama_url = "https://api.llama.fi/v2/chains"
     headers = {"accept": "*/*"}
-    shimmer_tvl = None
-    rank = None
+    pending_chains = set(chain_names)
+    chain_tvls = {}
+    # Number of chains with a higher TVL, for each wanted chain that was read already
+    higher_tvl_counts = {}
+    # TVLs of the chains listed before the last wanted chain, compared once its TVL is known
+    tvls_before = []
 
     try:
-        tvl_response = requests.get(defillama_url, headers=headers, timeout=10)
-        tvl_response.raise_for_status()  # Raise HTTPError for bad requests (4xx and 5xx status codes)
-        logger.debug("DefiLlama TVL response: %s", tvl_response.text)
-        
-        if tvl_response.status_code == 200:
-            tvl_data = tvl_response.json()
-            shimmer_entry = next((entry for entry in tvl_data if entry.get("name") == "ShimmerEVM"), None)
-            
-            if shimmer_entry:
-                shimmer_tvl = shimmer_entry.get("tvl")
-                tvl_data.sort(key=lambda x: x.get("tvl", 0), reverse=True)
-                rank = tvl_data.index(shimmer_entry) + 1
-
-                logger.debug("Shimmer TVL Value: %s", shimmer_tvl)
-                logger.debug("Shimmer TVL Rank: %s", rank)
-                
-        return {"shimmer_tvl": shimmer_tvl, "shimmer_rank": rank}
-
-    except requests.exceptions.Timeout:
+        async with aclosing(fetch_json_items(defillama_url, headers=headers)) as chains:
+            async for entry in chains:
+                tvl = entry.get("tvl") or 0
+                for chain_name, chain_tvl in chain_tvls.items():
+                    if tvl > chain_tvl:
+                        higher_tvl_counts[chain_name] += 1
+
+                chain_name = entry.get("name")
+                if chain_name in pending_chains:
+                    pending_chains.discard(chain_name)
+                    chain_tvls[chain_name] = tvl
+                    higher_tvl_counts[chain_name] = sum(1 for other_tvl in tvls_before if other_tvl > tvl)
+                if pending_chains:
+                    tvls_before.append(tvl)
+                else:
+                    tvls_before = None
+
+        defillama_data = {}
+        for chain_name, tvl in chain_tvls.items():
+            rank = higher_tvl_counts[chain_name] + 1
+            logger.debug("%s TVL Value: %s", chain_name, tvl)
+            logger.debug("%s TVL Rank: %s", chain_name, rank)
+            defillama_data[chain_name] = {"tvl": tvl, "rank": rank}
+
+        return defillama_data
+
+    except asyncio.TimeoutError:
         logger.error("DefiLlama API request timed out.")
-    except requests.exceptions.HTTPError as errh:
+    except aiohttp.ClientResponseError as errh:
         logger.error("HTTP Error occurred: %s", errh)
-    except requests.exceptions.RequestException as err:
-        logger.error("Request Exception occurred: %s", err)
\ No newline at end of file
+    except aiohttp.ClientError as err:
+        logger.error("Request Exception occurred: %s", err)
+    except ijson.JSONError as err:
+        logger.error("Malformed DefiLlama response: %s", err)
@@ -0,0 +1,276 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Shared asynchronous HTTP fetch layer for the Shimmer market data providers
+Version: 5.5.0
+"""
+import asyncio
+import logging
+import random
+import time
+import traceback
+import aiohttp
+import ijson
+import helpers.configuration_manager as configuration_manager
+from helpers.smr_market_data.smd_breaker import CircuitBreaker
+from helpers.smr_market_data.smd_cache import SourceCache, source_kind
+
+logger = logging.getLogger("discord_bot")
+
+# Load configuration
+config = configuration_manager.load_config('config.json')
+
+# Timeouts (in seconds) for a single HTTP request and for a whole data source,
+# the latter can be overridden per source with "market_data_timeouts" in config.json
+REQUEST_TIMEOUT = 10
+source_timeouts = {
+    "coingecko": 15,
+    "defillama": 20,
+    "geckoterminal": 30,
+    "shimmer": 30,
+    "bitfinex": 15,
+}
+source_timeouts.update(config.get("market_data_timeouts", {}))
+
+# Seconds the data of each source is served from cache, depending on how fast it
+# changes, can be overridden per source with "market_data_ttls" in config.json
+source_ttls = {
+    "coingecko": 5 * 60,
+    "defillama": 60 * 60,
+    "geckoterminal": 15 * 60,
+    "shimmer": 60 * 60,
+    "bitfinex": 60,
+}
+source_ttls.update(config.get("market_data_ttls", {}))
+
+# Retries of a failed source within its timeout, and the base delay before the first one
+source_retries = config.get("market_data_retries", 2)
+RETRY_DELAY = 1
+
+# Circuit breaker of each source, see CircuitBreaker. The backoff is jittered between
+# half and all of its value, so by default a tripped source sits out at least the next
+# scheduled refresh and at most the next seven
+refresh_interval = config.get("market_data_refresh_hours", 24) * 60 * 60
+breaker_failure_threshold = config.get("market_data_breaker_threshold", 2)
+breaker_base_backoff = config.get("market_data_backoff_seconds") or 2 * refresh_interval
+breaker_max_backoff = config.get("market_data_backoff_max_seconds") or 8 * refresh_interval
+source_breakers = {}
+
+# Connection pool settings of the shared HTTP session
+pool_limit = config.get("http_pool_limit", 30)
+pool_limit_per_host = config.get("http_pool_limit_per_host", 6)
+dns_cache_ttl = config.get("http_dns_cache_ttl", 300)
+keepalive_timeout = config.get("http_keepalive_timeout", 60)
+
+# One long-lived session shared by every provider, see start_session()
+_session = None
+
+# Connection reuse counters, every provider API is served over HTTPS so each
+# reused connection is a TCP and TLS handshake that did not have to happen
+connection_stats = {"connections_created": 0, "connections_reused": 0}
+
+
+# Functions
+async def _on_connection_create_end(session, trace_config_ctx, params):
+    connection_stats["connections_created"] += 1
+
+
+async def _on_connection_reuseconn(session, trace_config_ctx, params):
+    connection_stats["connections_reused"] += 1
+
+
+def start_session():
+    """
+    Create the shared HTTP session used by all market data providers.
+
+    The session keeps connections alive and pools them per host, and caches DNS
+    lookups, so consecutive requests to the same API skip the TCP and TLS handshakes.
+    It must be called from within the running event loop, calling it again while
+    the session is open returns the existing session.
+
+    Returns:
+        aiohttp.ClientSession: The shared session.
+    """
+    global _session
+
+    if _session is None or _session.closed:
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(_on_connection_create_end)
+        trace_config.on_connection_reuseconn.append(_on_connection_reuseconn)
+
+        connector = aiohttp.TCPConnector(
+            limit=pool_limit,
+            limit_per_host=pool_limit_per_host,
+            ttl_dns_cache=dns_cache_ttl,
+            keepalive_timeout=keepalive_timeout,
+        )
+        _session = aiohttp.ClientSession(connector=connector, trace_configs=[trace_config])
+        logger.info("Started the market data HTTP session")
+
+    return _session
+
+
+async def close_session():
+    """
+    Close the shared HTTP session and its pooled connections.
+    """
+    global _session
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("Closed the market data HTTP session, %s", get_connection_stats())
+    _session = None
+
+
+def get_session():
+    """
+    Get the shared HTTP session, starting it if it is not open yet.
+
+    Returns:
+        aiohttp.ClientSession: The shared session.
+    """
+    if _session is None or _session.closed:
+        return start_session()
+    return _session
+
+
+def get_connection_stats():
+    """
+    Get the connection reuse counters of the shared HTTP session.
+
+    Returns:
+        dict: Connections created and reused, and the number of handshakes saved by reusing them.
+    """
+    return {**connection_stats, "handshakes_saved": connection_stats["connections_reused"]}
+
+
+async def fetch_json(url, headers=None, timeout=REQUEST_TIMEOUT):
+    """
+    Fetch a URL and decode its JSON body without blocking the event loop.
+
+    Args:
+        url (str): The URL to request.
+        headers (dict, optional): Extra HTTP headers for the request.
+        timeout (float, optional): Total timeout of the request in seconds.
+
+    Returns:
+        The decoded JSON body of the response.
+    Raises:
+        aiohttp.ClientResponseError: If the API answers with a 4xx or 5xx status code.
+        aiohttp.ClientError: If there is an issue with the HTTP request.
+        asyncio.TimeoutError: If the request does not complete within the timeout.
+    """
+    session = get_session()
+    async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()  # Raise ClientResponseError for bad requests (4xx and 5xx status codes)
+        return await response.json(content_type=None)
+
+
+async def fetch_json_items(url, prefix="item", headers=None, timeout=REQUEST_TIMEOUT):
+    """
+    Fetch a URL and decode the items of its JSON body one at a time, while the body is downloaded.
+
+    Only the current item is held in memory, which keeps large list payloads cheap
+    when the caller only needs a few values out of them.
+
+    Args:
+        url (str): The URL to request.
+        prefix (str, optional): ijson prefix of the items, "item" for the elements of a top-level list.
+        headers (dict, optional): Extra HTTP headers for the request.
+        timeout (float, optional): Total timeout of the request in seconds.
+
+    Yields:
+        The decoded items, numbers are decoded as floats.
+    Raises:
+        aiohttp.ClientResponseError: If the API answers with a 4xx or 5xx status code.
+        aiohttp.ClientError: If there is an issue with the HTTP request.
+        asyncio.TimeoutError: If the request does not complete within the timeout.
+        ijson.JSONError: If the body is not valid JSON.
+    """
+    session = get_session()
+    async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+        response.raise_for_status()
+        async for item in ijson.items(response.content, prefix, use_float=True):
+            yield item
+
+
+async def fetch_all(sources):
+    """
+    Get the data of several market data sources concurrently, each one bounded by its own timeout.
+
+    Sources whose cached data has not expired are not fetched again, see source_cache.
+    A source that fails or times out does not cancel the others, its result is
+    reported as None so the caller can still work with a partial result.
+
+    Args:
+        sources (dict): Source names mapped to the coroutine function fetching their data.
+
+    Returns:
+        dict: Source names mapped to the data returned by the source, or None if it failed.
+    """
+    names = list(sources)
+    results = await asyncio.gather(*(source_cache.get(name, sources[name]) for name in names))
+    return dict(zip(names, results))
+
+
+def get_breaker(name):
+    """
+    Get the circuit breaker of a source.
+
+    Returns:
+        CircuitBreaker: The breaker, created the first time a source is requested.
+    """
+    breaker = source_breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(name, breaker_failure_threshold, breaker_base_backoff, breaker_max_backoff)
+        source_breakers[name] = breaker
+    return breaker
+
+
+async def _run_source(name, fetch):
+    breaker = get_breaker(name)
+    if not breaker.allow():
+        logger.info("Skipping %s, its circuit is open for %.0fs more", name, breaker.open_until - time.time())
+        return None
+
+    timeout = source_timeouts.get(source_kind(name), REQUEST_TIMEOUT)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+
+    try:
+        result = await asyncio.wait_for(_fetch_with_retries(name, fetch), timeout)
+    except asyncio.TimeoutError:
+        logger.error("Source %s timed out after %ss", name, timeout)
+        result = None
+    except asyncio.CancelledError:
+        # Cancelled e.g. at shutdown, this says nothing about the provider
+        breaker.release()
+        raise
+
+    if result is None:
+        breaker.record_failure()
+    else:
+        logger.debug("Source %s answered in %.2fs", name, loop.time() - started)
+        breaker.record_success()
+    return result
+
+
+async def _fetch_with_retries(name, fetch):
+    # The providers log their own errors and return None when they fail
+    for attempt in range(source_retries + 1):
+        if attempt:
+            delay = RETRY_DELAY * 2 ** (attempt - 1)
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+            logger.info("Retrying %s, attempt %s", name, attempt + 1)
+        try:
+            result = await fetch()
+        except Exception:
+            logger.error("Source %s failed:\n%s", name, traceback.format_exc())
+            continue
+        if result is not None:
+            return result
+    return None
+
+
+# Last data of every source, shared by the scheduled refresh and /updatesmd
+source_cache = SourceCache(source_ttls, _run_source)
@@ -1,77 +1,132 @@
 """"
 Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
 Description:
-Get API data for Shimmer from GeckoTerminal API
+Get API data for the tracked assets from GeckoTerminal API
 Version: 5.5.0
 """
-import requests
+import asyncio
+import aiohttp
 import logging
 import helpers.configuration_manager as configuration_manager
+from helpers.smr_market_data.smd_fetch import fetch_json
 
 logger = logging.getLogger("discord_bot")
 
 # Load configuration
 config = configuration_manager.load_config('config.json')
 
-# Shimmer data
-geckoterminal_ticker = config["geckoterminal_ticker"]
+# Pages requested at the same time, and last page that is requested
+geckoterminal_page_window = config.get("geckoterminal_page_window", 3)
+geckoterminal_max_pages = config.get("geckoterminal_max_pages", 10)
 
+# Pools per page of the GeckoTerminal API, a shorter page is the last one
+PAGE_SIZE = 20
 
-async def get_geckoterminal_data():
+# Network -> pool ID -> (24h volume in USD, 24h transactions) of the last refresh,
+# used for the pools on pages that could not be fetched
+_pool_cache = {}
+
+
+def _pool_totals(entry):
+    h24_volume = float(entry["attributes"]["volume_usd"]["h24"])
+    # Extract transactions data for h24
+    transactions_h24 = entry["attributes"]["transactions"]["h24"]
+    buys_h24 = transactions_h24.get("buys", 0)
+    sells_h24 = transactions_h24.get("sells", 0)
+    return h24_volume, buys_h24 + sells_h24
+
+
+async def _get_pools_page(geckoterminal_url, page):
+    try:
+        defi_volume_json = await fetch_json(geckoterminal_url + f"?page={page}", headers={"accept": "application/json"})
+    except aiohttp.ClientResponseError as errh:
+        # Past the last page
+        if errh.status == 404 and page > 1:
+            return []
+        raise
+    return defi_volume_json.get("data", [])
+
+
+async def _scan_pools(geckoterminal_url):
     """
-    Get GeckoTerminal Defi Volume data for ShimmerEVM.
+    Get the totals of every pool, a window of pages is requested at the same time.
 
     Returns:
-        dict: Dictionary containing ShimmerEVM's total 24h volume and total 24h transactions.
+        tuple: The totals per pool ID, and whether every page could be fetched.
     """
-    logger.info("Getting GeckoTerminal Defi Volume data for ShimmerEVM")
-    geckoterminal_url = f"https://api.geckoterminal.com/api/v2/networks/{geckoterminal_ticker}/pools"
-    headers = {"accept": "application/json"}
-    total_defi_volume_usd_h24 = 0
-    total_defi_tx_24h = 0
+    pools = {}
+    complete = True
     page = 1
+    while page <= geckoterminal_max_pages:
+        window = range(page, min(page + geckoterminal_page_window, geckoterminal_max_pages + 1))
+        results = await asyncio.gather(
+            *(_get_pools_page(geckoterminal_url, window_page) for window_page in window),
+            return_exceptions=True,
+        )
+
+        last_page_reached = False
+        for window_page, result in zip(window, results):
+            if isinstance(result, Exception):
+                logger.error("Could not get GeckoTerminal pools page %s: %r", window_page, result)
+                complete = False
+                continue
+            # Pools moving between pages while they are fetched are only counted once
+            for entry in result:
+                pools[entry["id"]] = _pool_totals(entry)
+            if len(result) < PAGE_SIZE:
+                last_page_reached = True
+
+        if last_page_reached:
+            return pools, complete
+        page = window.stop
+
+    logger.warning("Stopped at GeckoTerminal pools page %s, totals may be incomplete", geckoterminal_max_pages)
+    return pools, complete
+
+
+async def get_geckoterminal_data(network):
+    """
+    Get GeckoTerminal Defi Volume data for a network.
+
+    The 24h volume and transactions of every pool of the network are added up. Pools
+    of pages that could not be fetched count with their values of the previous refresh.
+
+    Args:
+        network (str): The GeckoTerminal ID of the network, e.g. 'shimmerevm'.
+
+    Returns:
+        dict: Dictionary containing the network's total 24h volume and total 24h transactions.
+    """
+    logger.info("Getting GeckoTerminal Defi Volume data for %s", network)
+    geckoterminal_url = f"https://api.geckoterminal.com/api/v2/networks/{network}/pools"
 
     try:
-        while True:
-            # Make a request to the GeckoTerminal API with the current page number
-            defi_volume = requests.get(geckoterminal_url + f"?page={page}", headers=headers, timeout=10)
-            defi_volume.raise_for_status()
-
-            if defi_volume.status_code == 200:
-                defi_volume_json = defi_volume.json()
-                # Extract and parse the JSON response
-                defi_volume_data = defi_volume_json.get("data", [])
-
-                for entry in defi_volume_data:
-                    h24_volume = float(entry["attributes"]["volume_usd"]["h24"])
-                    total_defi_volume_usd_h24 += h24_volume
-
-                    # Extract transactions data for h24
-                    transactions_h24 = entry["attributes"]["transactions"]["h24"]
-                    buys_h24 = transactions_h24.get("buys", 0)
-                    sells_h24 = transactions_h24.get("sells", 0)
-                    # Perform operations with buys_h24 and sells_h24 as needed
-                    total_defi_tx_24h += buys_h24 + sells_h24
-
-                logger.debug("Total USD 24h Volume for all pools: %s", total_defi_volume_usd_h24)
-                logger.debug("Total 24h Defi Transactions for ShimmerEVM: %s", total_defi_tx_24h)
-
-                if total_defi_volume_usd_h24 > 0 and total_defi_tx_24h > 0:
-                    return {"defi_total_volume": total_defi_volume_usd_h24, "total_defi_tx_24h": total_defi_tx_24h}
-                else:
-                    logger.debug("Shimmer Total Volume or Total Transactions not found in the response.")
-            elif defi_volume.status_code == 404:
-                logger.error("404 Client Error: Not Found for URL: %s", defi_volume.url)
-            else:
-                logger.error("Unexpected status code: %s", defi_volume.status_code)
-
-            page += 1
-
-    except requests.exceptions.Timeout:
+        pools, complete = await _scan_pools(geckoterminal_url)
+        if complete:
+            # Pools that are gone are dropped from the cache as well
+            _pool_cache[network] = pools
+        else:
+            previous_pools = _pool_cache.get(network, {})
+            stale_pools = {pool_id: totals for pool_id, totals in previous_pools.items() if pool_id not in pools}
+            logger.warning("Using the previous GeckoTerminal totals of %s pools", len(stale_pools))
+            _pool_cache[network] = {**stale_pools, **pools}
+
+        network_pools = _pool_cache[network]
+        if not network_pools:
+            logger.debug("%s Total Volume or Total Transactions not found in the response.", network)
+            return None
+
+        total_defi_volume_usd_h24 = sum(volume for volume, _ in network_pools.values())
+        total_defi_tx_24h = sum(transactions for _, transactions in network_pools.values())
+        logger.debug("Total USD 24h Volume for all pools: %s", total_defi_volume_usd_h24)
+        logger.debug("Total 24h Defi Transactions for %s: %s", network, total_defi_tx_24h)
+        return {"defi_total_volume": total_defi_volume_usd_h24, "total_defi_tx_24h": total_defi_tx_24h}
+
+    except asyncio.TimeoutError:
         logger.error("GeckoTerminal API request timed out.")
-    except requests.exceptions.HTTPError as errh:
+    except aiohttp.ClientResponseError as errh:
         logger.error("HTTP Error occurred: %s", errh)
-    except requests.exceptions.RequestException as err:
+    except aiohttp.ClientError as err:
         logger.error("Request Exception occurred: %s", err)
     except Exception as e:
-        logger.error("An unexpected error occurred: %s", e)
\ No newline at end of file
+        logger.error("An unexpected error occurred: %s", e)
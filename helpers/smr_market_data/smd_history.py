@@ -0,0 +1,108 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Time series of the market data, every refresh is stored in the database and
+downsampled to hourly and daily averages
+Version: 5.5.0
+"""
+import logging
+import math
+import time
+import helpers.configuration_manager as configuration_manager
+from helpers import db_manager
+from helpers.formatting import GLOW_PER_SMR
+
+logger = logging.getLogger("discord_bot")
+
+# Load configuration
+config = configuration_manager.load_config('config.json')
+
+# Resolutions of the stored points in seconds, 0 is one point per refresh
+RAW = 0
+HOURLY = 60 * 60
+DAILY = 24 * 60 * 60
+
+# Raw points are needed for a full day to compute the daily averages
+raw_retention = max(config.get("market_snapshot_raw_retention_days", 7) * DAILY, DAILY)
+hourly_retention = config.get("market_snapshot_hourly_retention_days", 90) * DAILY
+# Daily averages are kept forever
+
+
+def _number(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def collect_metrics(sources, depth_per_ticker=None, total_depth=None):
+    """
+    Flatten the data of one market data refresh into metrics.
+
+    Args:
+        sources (dict): The data of one asset per provider, as returned by split_sources().
+        depth_per_ticker (dict, optional): The depth of each Bitfinex order book, as returned
+                                           by calculate_bitfinex_depth().
+        total_depth (dict, optional): The depth of the consolidated order book, as returned
+                                      by calculate_bitfinex_depth().
+
+    Returns:
+        dict: Metric names mapped to their value, missing values are left out. build_embed()
+              stores them prefixed with the key of the asset, e.g. 'smr:price_usd'.
+    """
+    coingecko_data = sources.get("coingecko") or {}
+    defillama_data = sources.get("defillama") or {}
+    geckoterminal_data = sources.get("geckoterminal") or {}
+    shimmer_data = sources.get("shimmer") or {}
+
+    onchain_amount = _number(shimmer_data.get("shimmer_onchain_token_amount"))
+    metrics = {
+        "price_usd": coingecko_data.get("usd_price"),
+        "volume_24h_usd": coingecko_data.get("total_volume"),
+        "tvl_usd": defillama_data.get("tvl"),
+        "defillama_rank": defillama_data.get("rank"),
+        "defi_tx_24h": geckoterminal_data.get("total_defi_tx_24h"),
+        "defi_volume_24h_usd": geckoterminal_data.get("defi_total_volume"),
+        "onchain_smr": onchain_amount / GLOW_PER_SMR if onchain_amount is not None else None,
+    }
+
+    for ticker, depth in (depth_per_ticker or {}).items():
+        for level, sides in depth.items():
+            for side, quantity in sides.items():
+                metrics[f"depth.{ticker}.{level}.{side}"] = quantity
+
+    if total_depth:
+        metrics["spread_usd"] = total_depth.get("spread")
+        metrics["mid_price_usd"] = total_depth.get("mid_price")
+        for level, sides in total_depth["total_order_book_depth"].items():
+            for side, quantity in sides.items():
+                metrics[f"depth.total.{level}.{side}"] = quantity
+
+    return {metric: _number(value) for metric, value in metrics.items() if _number(value) is not None}
+
+
+async def record_snapshot(metrics, ts=None):
+    """
+    Store the metrics of a refresh, update the hourly and daily averages and delete
+    the points that are past their retention.
+
+    Args:
+        metrics (dict): Metric names mapped to their value, as returned by collect_metrics().
+        ts (int, optional): UNIX timestamp of the refresh. Defaults to now.
+
+    Returns:
+        int: The number of stored metrics.
+    """
+    ts = int(ts if ts is not None else time.time())
+    await db_manager.add_market_snapshots([(metric, RAW, ts, value) for metric, value in metrics.items()])
+
+    # Only the buckets the new points fall in change
+    await db_manager.downsample_market_snapshots(RAW, HOURLY, ts - ts % HOURLY)
+    await db_manager.downsample_market_snapshots(RAW, DAILY, ts - ts % DAILY)
+
+    await db_manager.remove_market_snapshots(RAW, ts - raw_retention)
+    await db_manager.remove_market_snapshots(HOURLY, ts - hourly_retention)
+
+    logger.info("Stored %s market data metrics", len(metrics))
+    return len(metrics)
@@ -0,0 +1,263 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Live Bitfinex order books kept current from a snapshot and a stream of incremental updates
+Version: 5.5.0
+"""
+import asyncio
+import json
+import logging
+import time
+import aiohttp
+from sortedcontainers import SortedDict
+import helpers.configuration_manager as configuration_manager
+from helpers.smr_market_data.smd_orderbook import OrderBook
+
+logger = logging.getLogger("discord_bot")
+
+# Load configuration
+config = configuration_manager.load_config('config.json')
+
+bitfinex_ws_url = "wss://api-pub.bitfinex.com/ws/2"
+bitfinex_book_length = config.get("bitfinex_book_length", 250)
+# Seconds to wait before reconnecting a stream that dropped
+reconnect_delay = 10
+
+# Live books by ticker, filled by start_live_books()
+live_books = {}
+_live_book_tasks = []
+# Session of the websockets, each one holds its connection for as long as it is open
+# so they are kept out of the connection pool of the shared market data session
+_ws_session = None
+
+
+class LiveOrderBook:
+    """
+    Raw (R0) order book of one ticker maintained from incremental updates.
+
+    Orders are aggregated per price in a sorted dict for each side, so applying an
+    update costs O(log n). Depth queries use an array snapshot of the book that is
+    only rebuilt when the book changed since the previous query.
+    """
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.orders = {}
+        self.bids = SortedDict()
+        self.asks = SortedDict()
+        self.synced = False
+        self.updated_at = None
+        self._version = 0
+        self._snapshot = None
+        self._snapshot_version = None
+
+    def _add(self, price, amount):
+        side = self.bids if amount > 0 else self.asks
+        total = side.get(price, 0) + abs(amount)
+        side[price] = total
+
+    def _remove(self, price, amount):
+        side = self.bids if amount > 0 else self.asks
+        total = side.get(price, 0) - abs(amount)
+        if total > 1e-12:
+            side[price] = total
+        else:
+            side.pop(price, None)
+
+    def apply_snapshot(self, entries):
+        """
+        Replace the whole book with a snapshot.
+
+        :param entries: Raw entries as [order_id, price, amount].
+        """
+        self.orders.clear()
+        self.bids.clear()
+        self.asks.clear()
+        for order_id, price, amount in entries:
+            if price and amount:
+                self.orders[order_id] = (price, amount)
+                self._add(price, amount)
+        self.synced = True
+        self._touch()
+
+    def apply_update(self, entry):
+        """
+        Apply one incremental update, a price of 0 removes the order from the book.
+
+        :param entry: Raw entry as [order_id, price, amount].
+        """
+        order_id, price, amount = entry
+        previous = self.orders.pop(order_id, None)
+        if previous is not None:
+            self._remove(*previous)
+        if price and amount:
+            self.orders[order_id] = (price, amount)
+            self._add(price, amount)
+        self._touch()
+
+    def handle(self, payload):
+        """
+        Apply a stream payload, either a snapshot (list of entries) or a single update.
+        """
+        if payload and isinstance(payload[0], list):
+            self.apply_snapshot(payload)
+        elif len(payload) == 3:
+            self.apply_update(payload)
+        elif not payload:
+            self.apply_snapshot([])
+
+    def _touch(self):
+        self._version += 1
+        self.updated_at = time.time()
+
+    def order_book(self):
+        """
+        Get the current book as an OrderBook.
+        """
+        if self._snapshot_version != self._version:
+            self._snapshot = OrderBook(
+                list(self.bids.keys()), list(self.bids.values()), list(self.asks.keys()), list(self.asks.values())
+            )
+            self._snapshot_version = self._version
+        return self._snapshot
+
+    def depth(self, usd_price, percentage_levels):
+        """
+        Get the current buy and sell quantities at percentage levels around a price.
+        """
+        return self.order_book().depth(usd_price, percentage_levels)
+
+    async def run(self, stream):
+        """
+        Keep the book current from a stream until the stream ends.
+
+        :param stream: Async iterable yielding snapshot and update payloads.
+        """
+        async for payload in stream:
+            self.handle(payload)
+
+
+def _get_ws_session():
+    global _ws_session
+    if _ws_session is None or _ws_session.closed:
+        _ws_session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+    return _ws_session
+
+
+def _book_payload(message):
+    """
+    Extract the book payload of a Bitfinex websocket message, or None for events and heartbeats.
+    """
+    if isinstance(message, list) and len(message) >= 2 and isinstance(message[1], list):
+        return message[1]
+    return None
+
+
+async def bitfinex_book_stream(ticker, length=bitfinex_book_length):
+    """
+    Stream the raw order book of a ticker from the Bitfinex websocket API.
+
+    Yields the snapshot first and then every update, until the connection closes.
+    """
+    async with _get_ws_session().ws_connect(bitfinex_ws_url, heartbeat=30) as websocket:
+        await websocket.send_json({"event": "subscribe", "channel": "book", "symbol": ticker, "prec": "R0", "len": str(length)})
+        async for message in websocket:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                break
+            payload = _book_payload(json.loads(message.data))
+            if payload is not None:
+                yield payload
+
+
+async def replay_book_stream(path, ticker, delay=0):
+    """
+    Stream the recorded Bitfinex websocket messages of a ticker from a file, one JSON message per line.
+
+    A recording can hold the books of several tickers, the messages of a ticker are
+    the ones on the channel of its "subscribed" event.
+
+    :param path: Path of the replay file.
+    :param ticker: The Bitfinex ticker whose messages are replayed.
+    :param delay: Seconds to wait between two messages.
+    """
+    channel_id = None
+    with open(path) as file:
+        for line in file:
+            if not line.strip():
+                continue
+            message = json.loads(line)
+            if isinstance(message, dict):
+                if message.get("event") == "subscribed" and message.get("channel") == "book":
+                    if message.get("symbol") == ticker:
+                        channel_id = message.get("chanId")
+                    elif message.get("chanId") == channel_id:
+                        # The channel was given to another ticker after a resubscription
+                        channel_id = None
+                continue
+            payload = _book_payload(message)
+            if payload is not None and channel_id is not None and message[0] == channel_id:
+                yield payload
+            await asyncio.sleep(delay)
+
+
+async def maintain_live_book(book, stream_factory):
+    """
+    Keep a live book current, reconnecting whenever its stream ends or fails.
+
+    :param book: The LiveOrderBook to maintain.
+    :param stream_factory: Callable returning a new stream for the book.
+    """
+    while True:
+        try:
+            await book.run(stream_factory())
+            logger.warning("Live order book stream for %s ended", book.ticker)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("Live order book stream for %s failed: %s", book.ticker, e)
+        book.synced = False
+        await asyncio.sleep(reconnect_delay)
+
+
+def start_live_books(tickers, replay_file=None):
+    """
+    Start maintaining live books for the given tickers in the running event loop.
+
+    :param tickers: The Bitfinex tickers to follow.
+    :param replay_file: Optional replay file used instead of the Bitfinex websocket.
+    """
+    for ticker in tickers:
+        book = live_books.setdefault(ticker, LiveOrderBook(ticker))
+        if replay_file:
+            stream_factory = lambda ticker=ticker: replay_book_stream(replay_file, ticker)
+        else:
+            stream_factory = lambda ticker=ticker: bitfinex_book_stream(ticker)
+        _live_book_tasks.append(asyncio.create_task(maintain_live_book(book, stream_factory)))
+    logger.info("Started live order books for %s", ", ".join(tickers))
+
+
+async def stop_live_books():
+    """
+    Stop maintaining the live books.
+    """
+    global _ws_session
+
+    for task in _live_book_tasks:
+        task.cancel()
+    await asyncio.gather(*_live_book_tasks, return_exceptions=True)
+    _live_book_tasks.clear()
+    live_books.clear()
+
+    if _ws_session is not None:
+        await _ws_session.close()
+        _ws_session = None
+
+
+def get_synced_book(ticker):
+    """
+    Get the live book of a ticker as an OrderBook, or None if it is not being followed or not synced.
+    """
+    book = live_books.get(ticker)
+    if book is not None and book.synced:
+        return book.order_book()
+    return None
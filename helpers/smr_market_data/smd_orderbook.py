@@ -0,0 +1,163 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Array backed order book, depth, spread and slippage are computed as vectorized NumPy operations
+Version: 5.5.0
+"""
+import numpy as np
+
+
+class OrderBook:
+    """
+    Order book stored as parallel price/amount arrays for each side.
+
+    Both sides are sorted by ascending price when the book is built and keep
+    cumulative amounts, so the depth at any number of price levels is a single
+    vectorized binary search.
+    """
+
+    def __init__(self, bid_prices, bid_amounts, ask_prices, ask_amounts):
+        """
+        Args:
+            bid_prices (array): Bid prices.
+            bid_amounts (array): Positive amounts bid at bid_prices.
+            ask_prices (array): Ask prices.
+            ask_amounts (array): Positive amounts asked at ask_prices.
+        """
+        bid_order = np.argsort(bid_prices, kind="stable")
+        ask_order = np.argsort(ask_prices, kind="stable")
+        self.bid_prices = np.asarray(bid_prices, dtype=float)[bid_order]
+        self.bid_amounts = np.asarray(bid_amounts, dtype=float)[bid_order]
+        self.ask_prices = np.asarray(ask_prices, dtype=float)[ask_order]
+        self.ask_amounts = np.asarray(ask_amounts, dtype=float)[ask_order]
+
+        # bid_depth[i] is the amount bid at bid_prices[i] or higher
+        self.bid_depth = np.concatenate((np.cumsum(self.bid_amounts[::-1])[::-1], [0.0]))
+        # ask_depth[i] is the amount asked below ask_prices[i]
+        self.ask_depth = np.concatenate(([0.0], np.cumsum(self.ask_amounts)))
+
+    @classmethod
+    def from_raw(cls, orders):
+        """
+        Build a book from raw Bitfinex entries.
+
+        Args:
+            orders (list): Raw order book entries as [order_id, price, amount], bids
+                           have a positive amount and asks a negative one.
+        """
+        entries = np.asarray(orders, dtype=float).reshape(-1, 3)
+        prices = entries[:, 1]
+        amounts = entries[:, 2]
+        bids = amounts > 0
+        asks = amounts < 0
+        return cls(prices[bids], amounts[bids], prices[asks], -amounts[asks])
+
+    @classmethod
+    def merge(cls, books):
+        """
+        Consolidate several books into a single one.
+
+        Args:
+            books (iterable): The OrderBook instances to merge.
+        """
+        books = list(books)
+        return cls(
+            np.concatenate([book.bid_prices for book in books] or [[]]),
+            np.concatenate([book.bid_amounts for book in books] or [[]]),
+            np.concatenate([book.ask_prices for book in books] or [[]]),
+            np.concatenate([book.ask_amounts for book in books] or [[]]),
+        )
+
+    @property
+    def best_bid(self):
+        return float(self.bid_prices[-1]) if self.bid_prices.size else None
+
+    @property
+    def best_ask(self):
+        return float(self.ask_prices[0]) if self.ask_prices.size else None
+
+    def spread(self):
+        """
+        Get the difference between the best ask and the best bid, or None if a side is empty.
+        """
+        if self.best_bid is None or self.best_ask is None:
+            return None
+        return self.best_ask - self.best_bid
+
+    def mid_price(self):
+        """
+        Get the price halfway between the best bid and the best ask, or None if a side is empty.
+        """
+        if self.best_bid is None or self.best_ask is None:
+            return None
+        return (self.best_bid + self.best_ask) / 2
+
+    def buy_quantity(self, price_levels):
+        """
+        Get the amounts bid at or above each price level.
+        """
+        return self.bid_depth[np.searchsorted(self.bid_prices, price_levels, side="left")]
+
+    def sell_quantity(self, price_levels):
+        """
+        Get the amounts asked at or below each price level.
+        """
+        return self.ask_depth[np.searchsorted(self.ask_prices, price_levels, side="right")]
+
+    def depth(self, usd_price, percentage_levels):
+        """
+        Get the buy and sell quantities at percentage levels around a price.
+
+        Args:
+            usd_price (float): The reference price of the cryptocurrency.
+            percentage_levels (list): Percentages away from the reference price, e.g. [-2, 2].
+
+        Returns:
+            dict: Keys like '-2%' mapped to dictionaries with the 'buy' and 'sell' quantities.
+        """
+        price_levels = usd_price * (1 + np.asarray(percentage_levels, dtype=float) / 100)
+        buy_quantities = self.buy_quantity(price_levels).tolist()
+        sell_quantities = self.sell_quantity(price_levels).tolist()
+        return {
+            f'{percentage}%': {'buy': buy, 'sell': sell}
+            for percentage, buy, sell in zip(percentage_levels, buy_quantities, sell_quantities)
+        }
+
+    def slippage(self, side, sizes):
+        """
+        Get the slippage of market orders filled against the book.
+
+        Args:
+            side (str): 'buy' to fill against the asks, 'sell' to fill against the bids.
+            sizes (array): Order sizes, in units of the base currency.
+
+        Returns:
+            array: Relative difference between the average fill price and the best
+                   price for each size, NaN where the book is not deep enough.
+        """
+        if side == "buy":
+            prices, amounts = self.ask_prices, self.ask_amounts
+        elif side == "sell":
+            prices, amounts = self.bid_prices[::-1], self.bid_amounts[::-1]
+        else:
+            raise ValueError(f"Unknown order side: {side}")
+
+        sizes = np.asarray(sizes, dtype=float)
+        if not prices.size:
+            return np.full(sizes.shape, np.nan)
+
+        filled = np.cumsum(amounts)
+        cost = np.cumsum(prices * amounts)
+        # Index of the price level that completes each order
+        last_level = np.searchsorted(filled, sizes, side="left")
+        in_book = last_level < prices.size
+        last_level = np.minimum(last_level, prices.size - 1)
+
+        filled_before = np.where(last_level > 0, filled[last_level - 1], 0.0)
+        cost_before = np.where(last_level > 0, cost[last_level - 1], 0.0)
+        total_cost = cost_before + (sizes - filled_before) * prices[last_level]
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            average_price = total_cost / sizes
+            slippage = np.abs(average_price / prices[0] - 1)
+        return np.where(in_book & (sizes > 0), slippage, np.where(sizes == 0, 0.0, np.nan))
@@ -4,65 +4,139 @@ Description:
 Get API data for Shimmer from Shimmer API
 Version: 5.5.0
 """
-import requests
+import asyncio
+import aiohttp
 import logging
+from collections import OrderedDict
 import helpers.configuration_manager as configuration_manager
+from helpers import db_manager
+from helpers.smr_market_data.smd_fetch import fetch_json
 
 logger = logging.getLogger("discord_bot")
 
 # Load configuration
 config = configuration_manager.load_config('config.json')
 
-# Shimmer data
-shimmer_onchain_deposit_alias = config["shimmer_onchain_deposit_alias"]
+# Spent outputs followed in one refresh at most, the walk resumes there on the next one
+shimmer_max_chain_hops = config.get("shimmer_max_chain_hops", 100)
 
-async def get_shimmer_data():
+SHIMMER_API_URL = "https://api.shimmer.network/api"
+HEADERS = {"accept": "application/json"}
+
+# Spent outputs never change, output ID -> ID the chain continues with
+SPENT_CACHE_SIZE = 1024
+_spent_outputs = OrderedDict()
+
+
+def _remember_spent(output_id, next_output_id):
+    _spent_outputs[output_id] = next_output_id
+    if len(_spent_outputs) > SPENT_CACHE_SIZE:
+        _spent_outputs.popitem(last=False)
+
+
+async def _get_alias_output_id(alias_id):
+    shimmer_explorer_api_url = f"{SHIMMER_API_URL}/indexer/v1/outputs/alias/{alias_id}"
+    shimmer_api_response = await fetch_json(shimmer_explorer_api_url, headers=HEADERS)
+    logger.debug("Shimmer Explorer API response: %s", shimmer_api_response)
+    items = shimmer_api_response.get("items", [])
+    return items[0] if items else None
+
+
+async def walk_output_chain(output_id):
+    """
+    Follow the spent outputs from an output until the unspent one.
+
+    Args:
+        output_id (str): The output the walk starts from.
+
+    Returns:
+        tuple: The ID of the last output reached and its amount, the amount is None if
+               the walk stopped after shimmer_max_chain_hops spent outputs.
+    """
+    for hop in range(shimmer_max_chain_hops + 1):
+        next_output_id = _spent_outputs.get(output_id)
+        if next_output_id is None:
+            output_id_data = await fetch_json(f"{SHIMMER_API_URL}/core/v2/outputs/{output_id}", headers=HEADERS)
+            metadata = output_id_data.get("metadata", {})
+            if not metadata.get("isSpent"):
+                logger.debug("Reached the unspent output after %s hops", hop)
+                return output_id, output_id_data.get("output", {}).get("amount")
+            next_output_id = metadata.get("transactionIdSpent")
+            _remember_spent(output_id, next_output_id)
+        output_id = next_output_id
+
+    logger.info("Stopped following the Shimmer output chain after %s hops", shimmer_max_chain_hops)
+    return output_id, None
+
+
+async def _walk_alias_chain(alias_id, chain_head, known_amount):
+    """
+    Walk the output chain of an alias from an output.
+
+    A walk that stops after shimmer_max_chain_hops made progress, the last known
+    amount is used and the next refresh continues from there. As long as no amount
+    is known, e.g. on the first refresh, the walk goes on until the unspent output
+    and saves its progress in case the refresh times out.
+
+    Returns:
+        tuple: The ID of the last output reached and the amount of the alias, None if it is not known.
+    """
+    while True:
+        output_id, amount = await walk_output_chain(chain_head)
+        if amount is not None:
+            return output_id, amount
+        if known_amount is not None:
+            logger.info("Using the last known Shimmer amount until the chain head is reached")
+            return output_id, known_amount
+        await db_manager.set_chain_head(alias_id, output_id)
+        chain_head = output_id
+
+
+async def get_shimmer_data(alias_id):
     """
     Get Shimmer API data for the specified on-chain deposit alias.
 
+    The walk starts from the last unspent output found by the previous refresh, so
+    only the outputs created since then are requested.
+
+    Args:
+        alias_id (str): The Shimmer alias where the tokens are tracked on chain.
+
     Returns:
         dict: Dictionary containing Shimmer's on-chain token amount.
     """
     logger.info("Getting data from Shimmer API")
-    shimmer_explorer_api_url = f"https://api.shimmer.network/api/indexer/v1/outputs/alias/{shimmer_onchain_deposit_alias}"
-    headers = {"accept": "application/json"}
 
     try:
-        shimmer_api_response = requests.get(shimmer_explorer_api_url, headers=headers, timeout=10)
-        shimmer_api_response.raise_for_status()
-        logger.debug("Shimmer Explorer API response: %s", shimmer_api_response.text)
-
-        if shimmer_api_response.status_code == 200:
-            # Extract and parse the JSON response
-            shimmer_api_response = shimmer_api_response.json()
-            response_output_id = shimmer_api_response.get("items", [])[0]
-            shimmer_onchain_token_amount = None
-
-            if response_output_id:
-                output_url = f"https://api.shimmer.network/api/core/v2/outputs/{response_output_id}"
-                while True:
-                    response_output_id = requests.get(output_url)
-                    output_id_data = response_output_id.json()
-
-                    if output_id_data.get("metadata", {}).get("isSpent"):
-                        item_content = output_id_data.get("metadata", {}).get("transactionIdSpent")
-                        output_url = f"https://api.shimmer.network/api/core/v2/outputs/{item_content}"
-                    else:
-                        shimmer_onchain_token_amount = output_id_data.get("output", {}).get("amount")
-                        break
-
-            if shimmer_onchain_token_amount is not None:
-                logger.debug("Shimmer On Chain Amount: %s", shimmer_onchain_token_amount)
-                return {"shimmer_onchain_token_amount":  shimmer_onchain_token_amount}
-            else:
-                logger.debug("Shimmer TVL Value not found in the response.")
+        saved_chain_head, known_amount = await db_manager.get_chain_head(alias_id) or (None, None)
+        chain_head = saved_chain_head
+        try:
+            if chain_head is None:
+                chain_head = await _get_alias_output_id(alias_id)
+            if chain_head is None:
+                logger.debug("Shimmer alias output not found in the response.")
+                return None
+            output_id, shimmer_onchain_token_amount = await _walk_alias_chain(alias_id, chain_head, known_amount)
+        except aiohttp.ClientResponseError as errh:
+            if errh.status != 404:
+                raise
+            # The saved output is not known by the node anymore, start from the alias again
+            logger.warning("Shimmer output %s not found, starting from the alias output", chain_head)
+            chain_head = await _get_alias_output_id(alias_id)
+            output_id, shimmer_onchain_token_amount = await _walk_alias_chain(alias_id, chain_head, known_amount)
+
+        if output_id != saved_chain_head or shimmer_onchain_token_amount != known_amount:
+            await db_manager.set_chain_head(alias_id, output_id, shimmer_onchain_token_amount)
 
+        if shimmer_onchain_token_amount is not None:
+            logger.debug("Shimmer On Chain Amount: %s", shimmer_onchain_token_amount)
+            return {"shimmer_onchain_token_amount":  shimmer_onchain_token_amount}
         else:
-            logger.debug("Error: Unable to fetch data from the API.")
+            logger.debug("Shimmer TVL Value not found in the response.")
 
-    except requests.exceptions.Timeout:
+    except asyncio.TimeoutError:
         logger.error("Shimmer API request timed out.")
-    except requests.exceptions.HTTPError as errh:
+    except aiohttp.ClientResponseError as errh:
         logger.error("HTTP Error occurred: %s", errh)
-    except requests.exceptions.RequestException as err:
+    except aiohttp.ClientError as err:
         logger.error("Request Exception occurred: %s", err)
@@ -1,18 +1,22 @@
 """"
 Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
 Description:
-Get API data for Shimmer from different sources
+Get API data for the tracked assets from different sources
 
 Version: 5.5.0
 """
 import logging
 import discord
 import datetime
-import pickle
+import functools
 import traceback
 import helpers.configuration_manager as configuration_manager
+from helpers.embed_cache import get_market_data_embed
 from helpers.formatting import format_currency, format_shimmer_amount, generate_discord_timestamp
-from helpers.smr_market_data.smd_bitfinex import calculate_total_bitfinex_depth
+from helpers.smr_market_data.smd_assets import assets
+from helpers.smr_market_data.smd_fetch import fetch_all, close_session, get_breaker, get_connection_stats, source_cache
+from helpers.smr_market_data.smd_bitfinex import calculate_bitfinex_depth, calculate_live_bitfinex_depth, combine_bitfinex_order_book_data, percentage_levels
+from helpers.smr_market_data.smd_history import collect_metrics, record_snapshot
 from helpers.smr_market_data.smd_coingecko import get_coingecko_exchange_data
 from helpers.smr_market_data.smd_shimmer import get_shimmer_data
 from helpers.smr_market_data.smd_geckoterminal import get_geckoterminal_data
@@ -24,111 +28,277 @@ logger = logging.getLogger("discord_bot")
 # Load configuration
 config = configuration_manager.load_config('config.json')
 
+# Shown in place of values whose data source did not answer
+NOT_AVAILABLE = "Not available"
+
+# Hours between two scheduled market data refreshes
+refresh_interval_hours = config.get("market_data_refresh_hours", 24)
+
+# Order book depth levels shown in the embed, as ± percentages around the price,
+# the same levels the depth is calculated for
+embed_depth_levels = sorted({abs(level) for level in percentage_levels})
+
+
 # Functions
-async def build_embed():
+def format_optional_currency(value, currency_symbol="$"):
     """
-    Build and save a Discord embed message containing Shimmer market data fetched from various sources.
+    Format a value as currency, or return a placeholder if the value is missing.
     """
-    logger.info("Building Discord embed message")
+    if value is None:
+        return NOT_AVAILABLE
+    return format_currency(value, currency_symbol)
 
-    try:
-        # Get data from API calls
-        # current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M")
-        coingecko_data = await get_coingecko_exchange_data()
-        defillama_data = await get_defillama_data()
-        geckoterminal_data = await get_geckoterminal_data()
-        shimmer_data = await get_shimmer_data()
-        total_defi_tx_24h = geckoterminal_data["total_defi_tx_24h"]
-        shimmer_rank = defillama_data["shimmer_rank"]
-        discord_timestamp = await generate_discord_timestamp()
-
-        # Set up Bitfinex order book depth
-        bitfinex_order_book_data = await calculate_total_bitfinex_depth(coingecko_data['usd_price'])
-        logger.debug("Final bitfinex_order_book_data: %s", bitfinex_order_book_data)
-
-
-        positive_order_book_depth_str_2_percent = ""
-        negative_order_book_depth_str_2_percent = ""
-        positive_order_book_depth_str_5_percent = ""
-        negative_order_book_depth_str_5_percent = ""
-        positive_order_book_depth_str_10_percent = ""
-        negative_order_book_depth_str_10_percent = ""
-        positive_order_book_depth_str_20_percent = ""
-        negative_order_book_depth_str_20_percent = ""
-
-        # Iterate through the order book data and format the strings
-        for percentage, data in bitfinex_order_book_data['total_order_book_depth'].items():
-
-            # Format the 'buy' data using format_currency() function
-            if 'buy' in data:
-                formatted_buy_data = await format_currency(data['buy'], "SMR")
-                buy_data = f"Buy: {formatted_buy_data}\n\n"
-            else:
-                logger.error(f"Missing 'buy' key for percentage level {percentage}")
-
-            # Format the 'sell' data using format_currency() function
-            if 'sell' in data:
-                formatted_sell_data = await format_currency(data['sell'], "SMR")
-                sell_data = f"Sell: {formatted_sell_data}\n\n"
-            else:
-                logger.error(f"Missing 'sell' key for percentage level {percentage}")
-
-            buy_sell_info = f"**{percentage}**:\n{buy_data if percentage.startswith('-') else sell_data}"
-
-            if int(percentage[:-1]) == -2:
-                negative_order_book_depth_str_2_percent += buy_sell_info
-            elif int(percentage[:-1]) == -5:
-                negative_order_book_depth_str_5_percent += buy_sell_info
-            elif int(percentage[:-1]) == -10:
-                negative_order_book_depth_str_10_percent += buy_sell_info
-            elif int(percentage[:-1]) == -20:
-                negative_order_book_depth_str_20_percent += buy_sell_info
-            elif int(percentage[:-1]) == 2:
-                positive_order_book_depth_str_2_percent += buy_sell_info
-            elif int(percentage[:-1]) == 5:
-                positive_order_book_depth_str_5_percent += buy_sell_info
-            elif int(percentage[:-1]) == 10:
-                positive_order_book_depth_str_10_percent += buy_sell_info
-            elif int(percentage[:-1]) == 20:
-                positive_order_book_depth_str_20_percent += buy_sell_info
-
-        # Create an embed instance
-        embed = discord.Embed(title="Shimmer Market Data", color=0x00FF00)
-        embed.add_field(name="Price (Coingecko)", value=f"{await format_currency(coingecko_data['usd_price'])}", inline=False)
-        embed.add_field(name="24h Volume (Bitfinex)", value=f"{await format_currency(coingecko_data['total_volume'])}", inline=False)
-        embed.add_field(name="\u200b", value="\u200b", inline=False)
-        embed.add_field(name="Defi Data", value="\u200b", inline=False)
-        embed.add_field(name="Shimmer Rank (DefiLlama)", value=shimmer_rank, inline=True)
-        embed.add_field(name="Shimmer Onchain Amount (Shimmer API)", value=f"{await format_currency(await format_shimmer_amount(shimmer_data['shimmer_onchain_token_amount']), 'SMR')}", inline=True)
-        embed.add_field(name="Total Value Locked (DefiLlama)", value=f"{await format_currency(defillama_data['shimmer_tvl'])}", inline=True)
-        embed.add_field(name="24h DeFi Transactions (GeckoTerminal)", value=total_defi_tx_24h, inline=True)
-        embed.add_field(name="24h DeFi Volume (GeckoTerminal)", value=f"{await format_currency(geckoterminal_data['defi_total_volume'])}", inline=True)
-        embed.add_field(name="\u200b", value="\u200b", inline=False)
-        embed.add_field(name="ShimmerEVM Order Books", value="\u200b", inline=False)
-        embed.add_field(name="Order Book depth ±2%", value=f"{negative_order_book_depth_str_2_percent} {positive_order_book_depth_str_2_percent}", inline=True)
-        embed.add_field(name="\u200b", value="\u200b", inline=False)
-        embed.add_field(name="Order Book depth ±5%", value=f"{negative_order_book_depth_str_5_percent} {positive_order_book_depth_str_5_percent}", inline=True)
+
+def format_optional_shimmer_amount(value):
+    """
+    Format a glow amount as SMR currency, or return a placeholder if the value is missing.
+    """
+    if value is None:
+        return NOT_AVAILABLE
+    return format_shimmer_amount(value)
+
+
+def add_order_book_fields(embed, title, total_order_book_depth, unit="SMR"):
+    """
+    Add the order book depth fields to an embed.
+
+    :param embed: The embed the fields are added to.
+    :param title: The name of the field heading the order book section.
+    :param total_order_book_depth: The depth per percentage level, as returned by calculate_bitfinex_depth().
+    :param unit: The unit the depth is given in.
+    """
+    # Look levels up by value so that e.g. '2%' and '2.0%' are the same level
+    depth_by_level = {float(percentage[:-1]): data for percentage, data in total_order_book_depth.items()}
+
+    embed.add_field(name=title, value="\u200b" if total_order_book_depth else NOT_AVAILABLE, inline=False)
+    for level in embed_depth_levels:
+        # The buy side is shown below the price and the sell side above it
+        buy_data = depth_by_level.get(-level, {}).get('buy')
+        sell_data = depth_by_level.get(level, {}).get('sell')
+        negative_order_book_depth_str = f"**-{level}%**:\nBuy: {format_currency(buy_data, unit)}\n\n" if buy_data is not None else ""
+        positive_order_book_depth_str = f"**{level}%**:\nSell: {format_currency(sell_data, unit)}\n\n" if sell_data is not None else ""
+        # Discord rejects fields without a visible value
+        depth_str = f"{negative_order_book_depth_str} {positive_order_book_depth_str}".strip() or NOT_AVAILABLE
+        embed.add_field(name=f"Order Book depth ±{level}%", value=depth_str, inline=True)
         embed.add_field(name="\u200b", value="\u200b", inline=False)
-        embed.add_field(name="Order Book depth ±10%", value=f"{negative_order_book_depth_str_10_percent} {positive_order_book_depth_str_10_percent}", inline=True)
+
+
+def asset_source_names(asset):
+    """
+    Get the names of the sources an asset takes its data from.
+
+    :param asset: The Asset.
+    :return: The per-provider source names, providers the asset has no identifier for are left out.
+    """
+    names = {}
+    if asset.coingecko_exchange_id and asset.coingecko_coin_id:
+        names["coingecko"] = f"coingecko:{asset.coingecko_exchange_id}"
+    if asset.defillama_chain:
+        names["defillama"] = "defillama"
+    if asset.geckoterminal_network:
+        names["geckoterminal"] = f"geckoterminal:{asset.geckoterminal_network}"
+    if asset.shimmer_onchain_deposit_alias:
+        names["shimmer"] = f"shimmer:{asset.shimmer_onchain_deposit_alias}"
+    if asset.bitfinex_tickers:
+        names["bitfinex"] = f"bitfinex:{asset.key}"
+    return names
+
+
+def batch_sources(tracked_assets):
+    """
+    Get the sources of all assets, with one request per provider where the provider allows it.
+
+    The coins traded on the same exchange share one Coingecko request and all chains
+    are read from one DefiLlama payload. Assets on the same GeckoTerminal network or
+    with the same Shimmer alias share that source.
+
+    :param tracked_assets: The Assets.
+    :return: Source names mapped to the coroutine function fetching their data.
+    """
+    coin_ids_by_exchange = {}
+    chains = {}
+    sources = {}
+    for asset in tracked_assets:
+        names = asset_source_names(asset)
+        if "coingecko" in names:
+            coin_ids_by_exchange.setdefault(asset.coingecko_exchange_id, {})[asset.coingecko_coin_id] = None
+        if "defillama" in names:
+            chains[asset.defillama_chain] = None
+        if "geckoterminal" in names:
+            sources[names["geckoterminal"]] = functools.partial(get_geckoterminal_data, asset.geckoterminal_network)
+        if "shimmer" in names:
+            sources[names["shimmer"]] = functools.partial(get_shimmer_data, asset.shimmer_onchain_deposit_alias)
+        if "bitfinex" in names:
+            sources[names["bitfinex"]] = functools.partial(combine_bitfinex_order_book_data, asset.bitfinex_tickers)
+
+    for exchange_id, coin_ids in coin_ids_by_exchange.items():
+        sources[f"coingecko:{exchange_id}"] = functools.partial(get_coingecko_exchange_data, exchange_id, list(coin_ids))
+    if chains:
+        sources["defillama"] = functools.partial(get_defillama_data, list(chains))
+    return sources
+
+
+def split_sources(asset, sources):
+    """
+    Get the data of one asset out of the batched source results.
+
+    :param asset: The Asset.
+    :param sources: The result of every batched source, as returned by fetch_all().
+    :return: The provider names mapped to the data of the asset, or None if the provider did not answer.
+    """
+    names = asset_source_names(asset)
+    asset_sources = {provider: sources.get(name) for provider, name in names.items()}
+    if asset_sources.get("coingecko") is not None:
+        asset_sources["coingecko"] = asset_sources["coingecko"].get(asset.coingecko_coin_id)
+    if asset_sources.get("defillama") is not None:
+        asset_sources["defillama"] = asset_sources["defillama"].get(asset.defillama_chain)
+    return asset_sources
+
+
+async def build_asset_embed(asset, asset_sources, last_known_sources):
+    """
+    Build the market data embed of an asset.
+
+    :param asset: The Asset.
+    :param asset_sources: The data of the asset per provider, as returned by split_sources().
+    :param last_known_sources: Source names held back by their circuit breaker mapped to the UNIX time of their data.
+    :return: The embed and the metrics to store, as returned by collect_metrics().
+    """
+    coingecko_data = asset_sources.get("coingecko") or {}
+    defillama_data = asset_sources.get("defillama") or {}
+    geckoterminal_data = asset_sources.get("geckoterminal") or {}
+    shimmer_data = asset_sources.get("shimmer") or {}
+    unit = asset.key.upper()
+
+    # Set up Bitfinex order book depth, it needs both the order books and the price
+    bitfinex_order_book_data = None
+    bitfinex_depth_per_ticker = None
+    if asset_sources.get("bitfinex") and "usd_price" in coingecko_data:
+        bitfinex_depth_per_ticker, bitfinex_order_book_data = await calculate_bitfinex_depth(coingecko_data['usd_price'], asset_sources["bitfinex"])
+    logger.debug("Final bitfinex_order_book_data of %s: %s", asset.key, bitfinex_order_book_data)
+    total_order_book_depth = bitfinex_order_book_data['total_order_book_depth'] if bitfinex_order_book_data else {}
+
+    # Create an embed instance, providers the asset is not tracked on are left out
+    embed = discord.Embed(title=f"{asset.name} Market Data", color=0x00FF00)
+    if "coingecko" in asset_sources:
+        embed.add_field(name="Price (Coingecko)", value=format_optional_currency(coingecko_data.get('usd_price')), inline=False)
+        embed.add_field(name=f"24h Volume ({asset.coingecko_exchange_id.capitalize()})", value=format_optional_currency(coingecko_data.get('total_volume')), inline=False)
         embed.add_field(name="\u200b", value="\u200b", inline=False)
-        embed.add_field(name="Order Book depth ±20%", value=f"{negative_order_book_depth_str_20_percent} {positive_order_book_depth_str_20_percent}", inline=True)
+    if {"defillama", "shimmer", "geckoterminal"} & asset_sources.keys():
+        embed.add_field(name="Defi Data", value="\u200b", inline=False)
+    if "defillama" in asset_sources:
+        embed.add_field(name=f"{asset.defillama_chain} Rank (DefiLlama)", value=defillama_data.get("rank") or NOT_AVAILABLE, inline=True)
+    if "shimmer" in asset_sources:
+        embed.add_field(name="Shimmer Onchain Amount (Shimmer API)", value=format_optional_shimmer_amount(shimmer_data.get('shimmer_onchain_token_amount')), inline=True)
+    if "defillama" in asset_sources:
+        embed.add_field(name="Total Value Locked (DefiLlama)", value=format_optional_currency(defillama_data.get('tvl')), inline=True)
+    if "geckoterminal" in asset_sources:
+        embed.add_field(name="24h DeFi Transactions (GeckoTerminal)", value=geckoterminal_data.get("total_defi_tx_24h", NOT_AVAILABLE), inline=True)
+        embed.add_field(name="24h DeFi Volume (GeckoTerminal)", value=format_optional_currency(geckoterminal_data.get('defi_total_volume')), inline=True)
+    if "bitfinex" in asset_sources:
         embed.add_field(name="\u200b", value="\u200b", inline=False)
+        add_order_book_fields(embed, f"{asset.name} Order Books", total_order_book_depth, unit)
 
-        # Add additional information
-        embed.add_field(name="Sources", value="Bitfinex, Coingecko, DefiLlama, GeckoTerminal, Shimmer API", inline=False)
-        embed.add_field(name="Last Data Update", value=f"{discord_timestamp}", inline=False)
-        embed.set_footer(text="Data updated every 24h\nMade with IOTA-❤️ by Antonio\nOut of beta SOON™")
+    # Add additional information
+    source_names = set(asset_source_names(asset).values())
+    asset_last_known_sources = {name: fetched_at for name, fetched_at in last_known_sources.items() if name in source_names}
+    if asset_last_known_sources:
+        embed.add_field(
+            name="Last Known Data",
+            value="\n".join(f"{name}: <t:{int(fetched_at)}:R>" for name, fetched_at in asset_last_known_sources.items()),
+            inline=False,
+        )
+    providers = {
+        "bitfinex": "Bitfinex",
+        "coingecko": "Coingecko",
+        "defillama": "DefiLlama",
+        "geckoterminal": "GeckoTerminal",
+        "shimmer": "Shimmer API",
+    }
+    embed.add_field(name="Sources", value=", ".join(title for provider, title in providers.items() if provider in asset_sources), inline=False)
+    embed.add_field(name="Last Data Update", value=f"{generate_discord_timestamp()}", inline=False)
+    embed.set_footer(text=f"Data updated every {refresh_interval_hours}h\nMade with IOTA-❤️ by Antonio\nOut of beta SOON™")
 
-        # Save the embed to a pickle file
-        with open("assets/embed_shimmer_market_data.pkl", "wb") as f:
-            pickle.dump(embed, f)
+    return embed, collect_metrics(asset_sources, bitfinex_depth_per_ticker, bitfinex_order_book_data)
+
+
+async def build_embed():
+    """
+    Build and publish a Discord embed message with the market data of every tracked asset.
+
+    The data of all assets is fetched at once, see batch_sources(). Each embed becomes
+    the current version of the market data embed cache of its asset, if the refresh
+    fails the previous version stays in place.
+
+    :return: The asset keys mapped to their new embed, or None if the refresh failed.
+    """
+    logger.info("Building Discord embed messages of %s assets", len(assets))
+
+    try:
+        # Get data from API calls, all expired sources are queried concurrently
+        sources = await fetch_all(batch_sources(assets))
+        missing_sources = [name for name, data in sources.items() if not data]
+        if len(missing_sources) == len(sources):
+            logger.error("No market data source answered, keeping the previous embeds")
+            return None
+        if missing_sources:
+            logger.warning("Building the embeds without data from: %s", ", ".join(missing_sources))
+        logger.info("Market data HTTP connections: %s", get_connection_stats())
+        # Sources that are held back by their circuit breaker are shown with their last known data
+        last_known_sources = {
+            name: source_cache.fetched_at(name)
+            for name in sources
+            if get_breaker(name).is_open and sources[name] and source_cache.fetched_at(name) is not None
+        }
+
+        embeds = {}
+        metrics = {}
+        for asset in assets:
+            embed, asset_metrics = await build_asset_embed(asset, split_sources(asset, sources), last_known_sources)
+
+            # Swap the embed in, the commands read it from memory
+            version = get_market_data_embed(asset.key).publish(embed)
+            logger.info("Published %s market data embed version %s", asset.key, version)
+            embeds[asset.key] = embed
+            metrics.update({f"{asset.key}:{metric}": value for metric, value in asset_metrics.items()})
+
+        # Keep the history of everything that was fetched
+        try:
+            await record_snapshot(metrics)
+        except Exception:
+            logger.error("Could not store the market data snapshot:\n%s", traceback.format_exc())
+        return embeds
 
     except Exception:
         logger.info(traceback.format_exc())
+        return None
+
+
+async def build_live_depth_embed(asset):
+    """
+    Build a Discord embed with the current depth of the live Bitfinex order books of an asset.
+
+    :param asset: The Asset.
+    :return: The embed, or None if the live order books are not available.
+    """
+    if not asset.bitfinex_tickers:
+        return None
+    live_depth = await calculate_live_bitfinex_depth(asset.bitfinex_tickers)
+    if live_depth is None:
+        return None
+
+    embed = discord.Embed(title=f"Live {asset.name} Bitfinex Order Books", color=0x00FF00)
+    embed.add_field(name="Mid Price (Bitfinex)", value=format_optional_currency(live_depth["mid_price"]), inline=False)
+    add_order_book_fields(embed, f"{asset.name} Order Books", live_depth["total_order_book_depth"], asset.key.upper())
+    embed.add_field(name="Last Data Update", value=f"{generate_discord_timestamp()}", inline=False)
+    return embed
 
 
 async def main():
-    await build_embed()
+    try:
+        await build_embed()
+    finally:
+        await close_session()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,100 @@
+""""
+Copyright © antonionardella 2023 - https://github.com/antonionardella (https://antonionardella.it)
+Description:
+Keep the monitored threads from being auto archived, only the threads about to be
+archived are touched and they are handled concurrently
+
+Version: 5.5.0
+"""
+import asyncio
+import logging
+import time
+import discord
+import helpers.configuration_manager as configuration_manager
+from helpers import db_manager
+
+logger = logging.getLogger("discord_bot")
+
+# Load configuration
+config = configuration_manager.load_config('config.json')
+# Number of threads handled at the same time
+keep_alive_concurrency = config.get("keep_alive_concurrency", 5)
+# Minutes between two checks of the monitored threads
+check_interval = config.get("keep_alive_check_minutes", 60) * 60
+
+
+def archive_time(thread):
+    """
+    Get the UNIX time a thread will be auto archived, based on its last activity.
+
+    :param thread: The thread, as cached by discord.py.
+    """
+    last_activity = thread.created_at or discord.utils.snowflake_time(thread.id)
+    if thread.archive_timestamp is not None:
+        last_activity = max(last_activity, thread.archive_timestamp)
+    if thread.last_message_id is not None:
+        last_activity = max(last_activity, discord.utils.snowflake_time(thread.last_message_id))
+    return last_activity.timestamp() + thread.auto_archive_duration * 60
+
+
+async def keep_them_all_alive(bot):
+    """
+    Keep alive every monitored thread that would be archived before the next check.
+
+    :param bot: The bot, its cache is used to know the last activity of the threads.
+    :return: The number of threads that were kept alive.
+    """
+    thread_ids = await db_manager.get_keep_alive_thread()
+    semaphore = asyncio.Semaphore(keep_alive_concurrency)
+    # One extra interval of margin, so a late or failed check does not let a thread expire
+    deadline = time.time() + 2 * check_interval
+    results = await asyncio.gather(
+        *(keep_alive(bot, thread_id, deadline, semaphore) for thread_id in thread_ids)
+    )
+    kept_alive = sum(results)
+    logger.info("Checked %s threads, kept %s alive", len(thread_ids), kept_alive)
+    return kept_alive
+
+
+async def keep_alive(bot, thread_id, deadline, semaphore):
+    """
+    Unarchive the thread, or send a 'ping' message in it and delete it, if it would
+    be archived before the deadline.
+
+    :return: True if the thread was kept alive.
+    """
+    try:
+        thread_id = int(thread_id)
+    except ValueError:
+        logger.warning("Invalid thread_id format: %s. Consider removing it from the list.", thread_id)
+        return False
+
+    # Active threads are cached, archived ones have to be fetched
+    thread = bot.get_channel(thread_id)
+    if isinstance(thread, discord.Thread) and not thread.archived and archive_time(thread) > deadline:
+        return False
+
+    async with semaphore:
+        try:
+            if thread is None:
+                thread = await bot.fetch_channel(thread_id)
+
+            if isinstance(thread, discord.Thread):
+                if thread.archived:
+                    await thread.edit(archived=False)
+                    logger.info("Unarchived thread %s", thread_id)
+                    return True
+                if archive_time(thread) > deadline:
+                    return False
+
+            logger.info("Keeping thread %s alive", thread_id)
+            msg = await thread.send('ping')
+            await msg.delete()
+            return True
+        except discord.NotFound:
+            logger.warning("Thread not found for thread_id: %s. Consider removing it from the list.", thread_id)
+        except discord.Forbidden:
+            logger.warning("Permission denied for thread_id: %s. Consider checking bot permissions.", thread_id)
+        except discord.HTTPException as e:
+            logger.error("An error occurred for thread_id: %s. Details: %s", thread_id, e)
+        return False